@@ -0,0 +1,167 @@
+import argparse
+import dataclasses
+import gc
+import json
+import time
+import tracemalloc
+import typing as T
+from datetime import datetime, timedelta, timezone
+
+import dateutil.parser
+
+from oc_stats.common import json_default
+from oc_stats.context import (
+    BaseContextBuilder,
+    CommentsContextBuilder,
+    TorrentsContextBuilder,
+)
+from oc_stats.context.comments import CommentDTO
+from oc_stats.context.torrents import TorrentDTO
+
+
+def make_plain_class(cls: type) -> type:
+    return dataclasses.make_dataclass(
+        f"Plain{cls.__name__}",
+        [(field.name, field.type) for field in dataclasses.fields(cls)],
+    )
+
+
+def asdict_json_default(obj: T.Any) -> T.Any:
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    return json_default(obj)
+
+
+def make_comment_fields(idx: int) -> dict[str, T.Any]:
+    return {
+        "source": "nyaa.si" if idx % 3 else "guestbook",
+        "website_title": f"[OldCastle] Show - {idx % 24:02d} [1080p].mkv",
+        "website_link": f"https://nyaa.si/view/{idx // 5}#com-{idx % 5}",
+        "comment_date": datetime(2018, 1, 1, tzinfo=timezone.utc)
+        + timedelta(minutes=idx),
+        "author_name": f"user{idx % 997}",
+        "author_avatar_url": f"https://i.nyaa.si/avatar/{idx % 997}.png",
+        "text": f"Thanks for the release number {idx}!",
+        "comment_id": f"nyaa.si:{idx // 5}:{idx % 5}",
+    }
+
+
+def make_torrent_fields(idx: int) -> dict[str, T.Any]:
+    return {
+        "source": "nyaa.si" if idx % 2 else "anidex.info",
+        "name": f"[OldCastle] Show {idx // 24} - {idx % 24:02d} [1080p].mkv",
+        "size": 1_400_000_000 + idx,
+        "seeder_count": idx % 50,
+        "leecher_count": idx % 7,
+        "download_count": idx * 3,
+        "comment_count": idx % 5,
+        "visible": bool(idx % 10),
+    }
+
+
+def measure_memory(factory: T.Callable[[], T.Any]) -> tuple[T.Any, int]:
+    gc.collect()
+    tracemalloc.start()
+    objects = factory()
+    size, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return objects, size
+
+
+def measure_time(func: T.Callable[[], T.Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def legacy_deserialize(cls: type, value: str) -> list[T.Any]:
+    ret = []
+    for item in json.loads(value):
+        if "comment_date" in item:
+            item["comment_date"] = dateutil.parser.parse(item["comment_date"])
+        ret.append(cls(**item))
+    return ret
+
+
+def run(
+    label: str,
+    cls: type,
+    builder: BaseContextBuilder,
+    make_fields: T.Callable[[int], dict[str, T.Any]],
+    count: int,
+    repeat: int,
+) -> None:
+    fields = [make_fields(idx) for idx in range(count)]
+    plain_cls = make_plain_class(cls)
+
+    print(f"{label} ({count} items):")
+    results: dict[str, list[float]] = {}
+    for variant, variant_cls, default, deserialize in [
+        (
+            "plain+asdict",
+            plain_cls,
+            asdict_json_default,
+            lambda value: legacy_deserialize(plain_cls, value),
+        ),
+        ("slotted", cls, json_default, builder.deserialize),
+    ]:
+        objects, size = measure_memory(
+            lambda: [variant_cls(**item) for item in fields]
+        )
+        serialize_time = measure_time(
+            lambda: json.dumps(objects, default=default), repeat
+        )
+        serialized = json.dumps(objects, default=default)
+        deserialize_time = measure_time(
+            lambda: deserialize(serialized), repeat
+        )
+        results[variant] = [size, serialize_time, deserialize_time]
+        print(
+            f"  {variant:>13}: "
+            f"{size / 1024 / 1024:8.2f} MiB, "
+            f"serialize {serialize_time * 1000:8.1f} ms, "
+            f"deserialize {deserialize_time * 1000:8.1f} ms"
+        )
+        del objects
+
+    before, after = results["plain+asdict"], results["slotted"]
+    print(
+        "  {:>13}: {:7.1f}% memory, {:7.1f}% serialize, "
+        "{:7.1f}% deserialize".format(
+            "reduction",
+            *(100 * (1 - new / old) for old, new in zip(before, after)),
+        )
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--comments", type=int, default=100_000)
+    parser.add_argument("--torrents", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    run(
+        "comments",
+        CommentDTO,
+        CommentsContextBuilder(),
+        make_comment_fields,
+        args.comments,
+        args.repeat,
+    )
+    run(
+        "torrents",
+        TorrentDTO,
+        TorrentsContextBuilder(),
+        make_torrent_fields,
+        args.torrents,
+        args.repeat,
+    )
+
+
+if __name__ == "__main__":
+    main()
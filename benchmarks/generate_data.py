@@ -0,0 +1,246 @@
+import argparse
+import logging
+import random
+import typing as T
+from datetime import date, datetime, timedelta, timezone
+
+from oc_stats.accounts import DEFAULT_ACCOUNT_NAME
+from oc_stats.app import publish_snapshot
+from oc_stats.common import DATA_DIR
+from oc_stats.context import (
+    AnimeRequestsContextBuilder,
+    CommentsContextBuilder,
+    DailyAnidexStatsContextBuilder,
+    DailyNyaaSiStatsContextBuilder,
+    DailyTrafficStatsContextBuilder,
+    TorrentHistoryContextBuilder,
+    TorrentsContextBuilder,
+    TransmissionStatsContextBuilder,
+)
+from oc_stats.context.anime_requests import AnimeRequestDTO
+from oc_stats.context.comments import CommentDTO
+from oc_stats.context.daily_traffic_stats import DailyTrafficStatDTO
+from oc_stats.context.torrent_history import TorrentHistoryDTO
+from oc_stats.context.torrents import TorrentDTO
+from oc_stats.context.transmission_stats import TransmissionStatsDTO
+from oc_stats.repo import ContextBuilderRepository
+
+WORDS = (
+    "thanks for the release subs timing typesetting episode batch "
+    "encode quality please continue great work translation song karaoke "
+    "signs fonts raw source audio video seed download anime season"
+).split()
+
+
+def make_sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + rng.choice(".!?")
+
+
+def make_markdown(rng: random.Random) -> str:
+    paragraphs = []
+    for _ in range(rng.randint(1, 3)):
+        paragraph = " ".join(
+            make_sentence(rng, 3, 15) for _ in range(rng.randint(1, 4))
+        )
+        roll = rng.random()
+        if roll < 0.1:
+            paragraph = "> " + paragraph
+        elif roll < 0.2:
+            paragraph = "\n".join(
+                f"- {make_sentence(rng, 2, 6)}" for _ in range(3)
+            )
+        elif roll < 0.3:
+            paragraph += " See https://example.com/" + rng.choice(WORDS)
+        elif roll < 0.4:
+            paragraph = paragraph.replace(" ", " **", 1) + "**"
+        paragraphs.append(paragraph)
+    return "\n\n".join(paragraphs)
+
+
+def make_daily_totals(
+    rng: random.Random, start: date, days: int, daily_mean: int
+) -> dict[date, int]:
+    ret: dict[date, int] = {}
+    total = 0
+    for offset in range(days):
+        total += max(0, int(rng.gauss(daily_mean, daily_mean / 3)))
+        ret[start + timedelta(days=offset)] = total
+    return ret
+
+
+def generate(
+    seed: int,
+    years: float,
+    comment_count: int,
+    torrent_count: int,
+    request_count: int,
+) -> dict[str, T.Any]:
+    rng = random.Random(seed)
+    today = date.today()
+    days = int(years * 365)
+    start = today - timedelta(days=days - 1)
+    start_time = datetime.combine(start, datetime.min.time(), timezone.utc)
+
+    torrents = [
+        TorrentDTO(
+            source=rng.choice(["nyaa.si", "anidex.info"]),
+            name=f"[OldCastle] Show {idx // 12} - {idx % 12 + 1:02d} [1080p]",
+            size=rng.randint(200, 4000) * 1024 * 1024,
+            seeder_count=rng.randint(0, 50),
+            leecher_count=rng.randint(0, 5),
+            download_count=rng.randint(10, 5000),
+            comment_count=rng.randint(0, 10),
+            visible=rng.random() > 0.05,
+        )
+        for idx in range(torrent_count)
+    ]
+
+    history: dict[tuple[str, int], TorrentHistoryDTO] = {}
+    for idx, torrent in enumerate(torrents):
+        first_day = start + timedelta(days=rng.randrange(days))
+        item = TorrentHistoryDTO(
+            source=torrent.source,
+            torrent_id=idx,
+            name=torrent.name,
+            last_seen=today,
+        )
+        downloads = 0
+        for offset in range((today - first_day).days + 1):
+            downloads += int(rng.expovariate(1 / max(1, 30 - offset)))
+            item.record(
+                first_day + timedelta(days=offset),
+                seeder_count=max(0, 30 - offset // 7),
+                leecher_count=0,
+                download_count=downloads,
+                comment_count=min(10, offset // 30),
+            )
+        history[item.key] = item
+
+    comments = sorted(
+        (
+            CommentDTO(
+                source=(source := rng.choice(["guestbook", "nyaa.si"])),
+                website_title=(
+                    None
+                    if source == "guestbook"
+                    else rng.choice(torrents).name
+                ),
+                website_link=f"https://example.com/{source}/{idx}",
+                comment_date=start_time
+                + timedelta(seconds=rng.randrange(days * 86400)),
+                author_name=f"user{rng.randrange(comment_count // 10 + 1)}",
+                author_avatar_url=(
+                    f"https://www.gravatar.com/avatar/{idx:032x}?d=retro"
+                ),
+                text=make_markdown(rng),
+                comment_id=f"{source}:{idx}",
+            )
+            for idx in range(comment_count)
+        ),
+        key=lambda comment: comment.comment_date,
+        reverse=True,
+    )
+
+    anime_requests = sorted(
+        (
+            AnimeRequestDTO(
+                date=start_time
+                + timedelta(seconds=rng.randrange(days * 86400)),
+                title=make_sentence(rng, 1, 5),
+                link=f"https://anidb.net/anime/{idx}",
+                anidb_id=idx,
+                comment=make_markdown(rng) if rng.random() < 0.5 else None,
+                synopsis=" ".join(make_sentence(rng, 5, 20) for _ in range(5)),
+                type=rng.choice(["TV Series", "Movie", "OVA"]),
+                episodes=rng.randint(1, 26),
+                year=rng.randint(1980, today.year),
+            )
+            for idx in range(request_count)
+        ),
+        key=lambda request: request.date,
+        reverse=True,
+    )
+
+    return {
+        AnimeRequestsContextBuilder.context_key: anime_requests,
+        CommentsContextBuilder.context_key: comments,
+        DailyAnidexStatsContextBuilder.context_key: {
+            DEFAULT_ACCOUNT_NAME: make_daily_totals(rng, start, days, 50)
+        },
+        DailyNyaaSiStatsContextBuilder.context_key: {
+            DEFAULT_ACCOUNT_NAME: make_daily_totals(rng, start, days, 400)
+        },
+        DailyTrafficStatsContextBuilder.context_key: {
+            DEFAULT_ACCOUNT_NAME: [
+                DailyTrafficStatDTO(
+                    day=start + timedelta(days=offset),
+                    requests=(requests := rng.randint(500, 5000)),
+                    page_views=requests // 3,
+                    unique_visitors=requests // 10,
+                )
+                for offset in range(days)
+            ]
+        },
+        TorrentHistoryContextBuilder.context_key: history,
+        TorrentsContextBuilder.context_key: torrents,
+        TransmissionStatsContextBuilder.context_key: TransmissionStatsDTO(
+            torrent_count=torrent_count,
+            active_torrent_count=torrent_count // 2,
+            downloaded_bytes=rng.randint(10**12, 10**13),
+            uploaded_bytes=rng.randint(10**13, 10**14),
+            uptime=timedelta(days=days),
+        ),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=f"write synthetic data for every builder to {DATA_DIR} "
+        "(set OC_STATS_DATA_DIR to write elsewhere)"
+    )
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--comments", type=int, default=100_000)
+    parser.add_argument("--torrents", type=int, default=2_000)
+    parser.add_argument("--requests", type=int, default=2_000)
+    parser.add_argument(
+        "--force", action="store_true", help="overwrite existing data"
+    )
+    parser.add_argument(
+        "--no-snapshot",
+        action="store_true",
+        help="do not publish a dashboard snapshot",
+    )
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+
+    repo = ContextBuilderRepository()
+    existing = [
+        builder.db_path
+        for builder in repo.builders
+        if builder.db_path.exists()
+    ]
+    if existing and not args.force:
+        parser.error(f"{existing[0]} already exists, use --force to overwrite")
+
+    repo.data = generate(
+        seed=args.seed,
+        years=args.years,
+        comment_count=int(args.comments * args.scale),
+        torrent_count=int(args.torrents * args.scale),
+        request_count=int(args.requests * args.scale),
+    )
+    repo.save_data()
+    for builder in repo.builders:
+        size = builder.db_path.stat().st_size
+        logging.info(f"generate: {builder.db_path} ({size} bytes)")
+
+    if not args.no_snapshot:
+        publish_snapshot(repo)
+
+
+if __name__ == "__main__":
+    main()
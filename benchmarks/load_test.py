@@ -0,0 +1,177 @@
+import argparse
+import http.client
+import json
+import logging
+import resource
+import statistics
+import subprocess
+import threading
+import time
+import typing as T
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from werkzeug.serving import make_server
+
+from oc_stats.app import app
+from oc_stats.common import DATA_DIR
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+
+def get_commit() -> str:
+    try:
+        return (
+            subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                check=True,
+                stdout=subprocess.PIPE,
+                cwd=Path(__file__).parent,
+            )
+            .stdout.decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def make_client_fetcher(
+    path: str, headers: dict[str, str]
+) -> T.Callable[[], int]:
+    local = threading.local()
+
+    def fetch() -> int:
+        if not hasattr(local, "client"):
+            local.client = app.test_client()
+        response = local.client.get(path, headers=headers)
+        size = len(response.get_data())
+        response.close()
+        return size
+
+    return fetch
+
+
+def make_wsgi_fetcher(
+    port: int, path: str, headers: dict[str, str]
+) -> T.Callable[[], int]:
+    def fetch() -> int:
+        connection = http.client.HTTPConnection("127.0.0.1", port)
+        connection.request("GET", path, headers=headers)
+        size = len(connection.getresponse().read())
+        connection.close()
+        return size
+
+    return fetch
+
+
+def percentile(values: list[float], fraction: float) -> float:
+    return statistics.quantiles(values, n=100, method="inclusive")[
+        int(fraction * 100) - 1
+    ]
+
+
+def run(
+    fetch: T.Callable[[], int], request_count: int, concurrency: int
+) -> dict[str, T.Any]:
+    start = time.perf_counter()
+    first_size = fetch()
+    first_latency = time.perf_counter() - start
+
+    latencies: list[float] = []
+    sizes: list[int] = []
+
+    def timed_fetch(_idx: int) -> None:
+        request_start = time.perf_counter()
+        sizes.append(fetch())
+        latencies.append(time.perf_counter() - request_start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(timed_fetch, range(request_count)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "first_request_ms": first_latency * 1000,
+        "first_response_bytes": first_size,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "throughput_rps": request_count / elapsed,
+        "mean_response_bytes": statistics.mean(sizes),
+        "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        / 1024,
+    }
+
+
+def print_comparison(
+    result: dict[str, T.Any], previous: T.Optional[dict[str, T.Any]]
+) -> None:
+    for key, value in result["metrics"].items():
+        line = f"{key:>22}: {value:12.2f}"
+        if previous and key in previous["metrics"]:
+            old_value = previous["metrics"][key]
+            if old_value:
+                change = 100 * (value / old_value - 1)
+                line += f" ({change:+.1f}% vs {previous['commit']})"
+        print(line)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=f"load-test the dashboard using the data in {DATA_DIR} "
+        "(see benchmarks.generate_data)"
+    )
+    parser.add_argument("--mode", choices=["client", "wsgi"], default="client")
+    parser.add_argument("--path", default="/")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--accept-encoding", default="br, gzip")
+    parser.add_argument("--label", default="")
+    parser.add_argument(
+        "--no-save", action="store_true", help="do not store the results"
+    )
+    args = parser.parse_args()
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    headers = {"Accept-Encoding": args.accept_encoding}
+    server = None
+    if args.mode == "wsgi":
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        fetch = make_wsgi_fetcher(server.port, args.path, headers)
+    else:
+        fetch = make_client_fetcher(args.path, headers)
+
+    try:
+        metrics = run(fetch, args.requests, args.concurrency)
+    finally:
+        if server:
+            server.shutdown()
+
+    result = {
+        "commit": get_commit(),
+        "label": args.label,
+        "timestamp": datetime.now().isoformat(),
+        "options": vars(args),
+        "metrics": metrics,
+    }
+
+    previous_paths = sorted(RESULTS_DIR.glob("*.json"))
+    previous = (
+        json.loads(previous_paths[-1].read_text()) if previous_paths else None
+    )
+    print_comparison(result, previous)
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = RESULTS_DIR / (
+            datetime.now().strftime("%Y%m%d-%H%M%S")
+            + f"-{result['commit']}.json"
+        )
+        path.write_text(json.dumps(result, indent=4))
+        print(f"results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
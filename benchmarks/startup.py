@@ -0,0 +1,127 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from benchmarks.load_test import RESULTS_DIR, get_commit, print_comparison
+
+STARTUP_RESULTS_DIR = RESULTS_DIR / "startup"
+CREDENTIAL_PREFIXES = (
+    "NYAA_SI_",
+    "ANIDEX_",
+    "ANIDB_",
+    "CLOUDFLARE_",
+    "OC_STATS_ACCOUNTS",
+)
+SCRAPER_MODULES = [
+    "requests",
+    "lxml",
+    "humanfriendly",
+    "cachetools",
+    "dateutil",
+    "PIL",
+]
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+from oc_stats.app import app
+imported = time.perf_counter()
+first_request = None
+if {request!r}:
+    response = app.test_client().get("/", headers={{"Accept-Encoding": "br"}})
+    response.get_data()
+    first_request = time.perf_counter() - imported
+print(json.dumps({{
+    "import_s": imported - start,
+    "first_request_s": first_request,
+    "peak_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "module_count": len(sys.modules),
+    "scraper_modules": [name for name in {modules!r} if name in sys.modules],
+}}))
+"""
+
+
+def run_probe(request: bool) -> dict:
+    env = {
+        key: value
+        for key, value in os.environ.items()
+        if not key.startswith(CREDENTIAL_PREFIXES)
+    }
+    env["PYTHONPATH"] = str(Path(__file__).parent.parent)
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            PROBE.format(request=request, modules=SCRAPER_MODULES),
+        ],
+        check=True,
+        stdout=subprocess.PIPE,
+        env=env,
+    )
+    return json.loads(process.stdout)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="measure the cold start of the web process "
+        "without any scraper credentials in the environment"
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument(
+        "--no-request",
+        action="store_true",
+        help="do not serve a first request after importing the app",
+    )
+    parser.add_argument("--label", default="")
+    parser.add_argument(
+        "--no-save", action="store_true", help="do not store the results"
+    )
+    args = parser.parse_args()
+
+    probes = [run_probe(not args.no_request) for _ in range(args.runs)]
+    metrics = {
+        "import_ms": 1000
+        * statistics.median(probe["import_s"] for probe in probes),
+        "peak_rss_mib": max(probe["peak_rss_mib"] for probe in probes),
+        "module_count": max(probe["module_count"] for probe in probes),
+    }
+    if not args.no_request:
+        metrics["first_request_ms"] = 1000 * statistics.median(
+            probe["first_request_s"] for probe in probes
+        )
+    result = {
+        "commit": get_commit(),
+        "label": args.label,
+        "timestamp": datetime.now().isoformat(),
+        "options": vars(args),
+        "metrics": metrics,
+        "scraper_modules": probes[-1]["scraper_modules"],
+    }
+
+    previous_paths = sorted(STARTUP_RESULTS_DIR.glob("*.json"))
+    previous = (
+        json.loads(previous_paths[-1].read_text()) if previous_paths else None
+    )
+    print_comparison(result, previous)
+    print(
+        "scraper modules loaded: "
+        + (", ".join(result["scraper_modules"]) or "none")
+    )
+
+    if not args.no_save:
+        STARTUP_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        path = STARTUP_RESULTS_DIR / (
+            datetime.now().strftime("%Y%m%d-%H%M%S")
+            + f"-{result['commit']}.json"
+        )
+        path.write_text(json.dumps(result, indent=4))
+        print(f"results saved to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+import json
+import os
+import typing as T
+from dataclasses import dataclass, field
+from pathlib import Path
+
+DEFAULT_ACCOUNT_NAME = "default"
+
+
+@dataclass(frozen=True, slots=True)
+class NyaaSiAccount:
+    name: str
+    user: str
+    password: str = field(repr=False)
+    request_interval: float = 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class AnidexAccount:
+    name: str
+    group_id: str
+    user: str
+    password: str = field(repr=False)
+    request_interval: float = 0.0
+
+
+@dataclass(frozen=True, slots=True)
+class CloudflareZone:
+    name: str
+    zone: str
+    api_user: str
+    api_key: str = field(repr=False)
+
+
+def _load_config() -> dict[str, list[dict[str, T.Any]]]:
+    path = os.environ.get("OC_STATS_ACCOUNTS")
+    if not path:
+        return {}
+    return T.cast(
+        dict[str, list[dict[str, T.Any]]], json.loads(Path(path).read_text())
+    )
+
+
+def get_legacy_account_name(service: str) -> str:
+    # data written before accounts were tracked separately belongs to the
+    # first configured account, which is the one that was tracked back then
+    items = _load_config().get(service)
+    return str(items[0]["name"]) if items else DEFAULT_ACCOUNT_NAME
+
+
+def get_nyaa_si_accounts() -> list[NyaaSiAccount]:
+    config = _load_config()
+    if "nyaa.si" in config:
+        return [NyaaSiAccount(**item) for item in config["nyaa.si"]]
+    return [
+        NyaaSiAccount(
+            name=DEFAULT_ACCOUNT_NAME,
+            user=os.environ["NYAA_SI_USER"],
+            password=os.environ["NYAA_SI_PASS"],
+        )
+    ]
+
+
+def get_anidex_accounts() -> list[AnidexAccount]:
+    config = _load_config()
+    if "anidex" in config:
+        return [AnidexAccount(**item) for item in config["anidex"]]
+    return [
+        AnidexAccount(
+            name=DEFAULT_ACCOUNT_NAME,
+            group_id=os.environ["ANIDEX_GROUP_ID"],
+            user=os.environ["ANIDEX_USER"],
+            password=os.environ["ANIDEX_PASS"],
+        )
+    ]
+
+
+def get_cloudflare_zones() -> list[CloudflareZone]:
+    config = _load_config()
+    if "cloudflare" in config:
+        return [CloudflareZone(**item) for item in config["cloudflare"]]
+    return [
+        CloudflareZone(
+            name=DEFAULT_ACCOUNT_NAME,
+            zone=os.environ["CLOUDFLARE_ZONE"],
+            api_user=os.environ["CLOUDFLARE_API_USER"],
+            api_key=os.environ["CLOUDFLARE_API_KEY"],
+        )
+    ]
@@ -1,22 +1,21 @@
 import logging
 import os
-import time
 import typing as T
 from dataclasses import dataclass
-from datetime import date
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
 from xml.etree import ElementTree
 
 import dateutil.parser
 import requests
 
-from oc_stats.common import CACHE_DIR
+from oc_stats.cache import CacheManager
+from oc_stats.deadline import get_timeout, sleep
 
-ANIDB_CLIENT = os.environ["ANIDB_CLIENT"]
-ANIDB_CLIENTVER = os.environ["ANIDB_CLIENTVER"]
+anidb_cache = CacheManager("anidb", pinned=True)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class AniDBInfo:
     id: int
     title: str
@@ -25,6 +24,7 @@ class AniDBInfo:
     synopsis: str
     start_date: T.Optional[date]
     end_date: T.Optional[date]
+    fetched: datetime
 
 
 class XmlParser:
@@ -48,39 +48,80 @@ def process_date(text: str) -> T.Optional[date]:
         return None
 
 
-def get_anidb_info(anime_id: int) -> T.Optional[AniDBInfo]:
-    entry_cache_path = CACHE_DIR / "anidb" / f"{anime_id}.xml"
-    image_cache_path = CACHE_DIR / "anidb" / f"{anime_id}.jpg"
+def _get_cache_age(path: Path) -> T.Optional[timedelta]:
+    try:
+        mtime = path.stat().st_mtime
+    except FileNotFoundError:
+        return None
+    return datetime.now(timezone.utc) - datetime.fromtimestamp(
+        mtime, timezone.utc
+    )
+
+
+def _is_error(text: str) -> bool:
+    return text.lstrip().startswith("<error")
+
+
+def _get_cache_keys(anime_id: int) -> tuple[str, str]:
+    return f"{anime_id}.xml", f"{anime_id}.jpg"
 
-    if entry_cache_path.exists():
+
+def get_anidb_info(
+    anime_id: int, max_age: T.Optional[timedelta] = None
+) -> T.Optional[AniDBInfo]:
+    entry_cache_key, image_cache_key = _get_cache_keys(anime_id)
+
+    entry_cache_path = anidb_cache.get(entry_cache_key)
+    if entry_cache_path and _is_error(entry_cache_path.read_text()):
+        anidb_cache.discard(entry_cache_key)
+        entry_cache_path = None
+    cache_age = _get_cache_age(entry_cache_path) if entry_cache_path else None
+    if (
+        entry_cache_path
+        and cache_age is not None
+        and (max_age is None or cache_age <= max_age)
+    ):
         logging.info(f"anidb: using cached info for {anime_id}")
     else:
         logging.info(f"anidb: fetching info for {anime_id}")
-        response = requests.get(
-            f"http://api.anidb.net:9001/httpapi?request=anime&aid={anime_id}"
-            f"&client={ANIDB_CLIENT}&clientver={ANIDB_CLIENTVER}&protover=1"
-        )
-        response.raise_for_status()
-        time.sleep(2)
-        entry_cache_path.parent.mkdir(parents=True, exist_ok=True)
-        entry_cache_path.write_text(response.text)
+        try:
+            response = requests.get(
+                "http://api.anidb.net:9001/httpapi?request=anime"
+                f"&aid={anime_id}&client={os.environ['ANIDB_CLIENT']}"
+                f"&clientver={os.environ['ANIDB_CLIENTVER']}&protover=1",
+                timeout=get_timeout(),
+            )
+            response.raise_for_status()
+        except requests.RequestException as ex:
+            logging.warning(f"anidb: failed to fetch {anime_id}: {ex}")
+            return None
+        sleep(2)
+        # for fuck's sake…
+        if _is_error(response.text):
+            logging.warning(
+                f"anidb: error for {anime_id}: {response.text.strip()}"
+            )
+            return None
+        entry_cache_path = anidb_cache.put(entry_cache_key, response.text)
 
     doc = XmlParser(entry_cache_path)
 
-    # for fuck's sake…
-    if entry_cache_path.read_text().startswith("<error"):
-        return None
-
     image_url = "http://cdn.anidb.net/images/main/" + doc.get_text(
         ".//picture"
     )
-    if image_cache_path.exists():
+    if anidb_cache.get(image_cache_key):
         logging.info(f"anidb: using cached picture for {anime_id}")
     else:
-        response = requests.get(image_url)
-        response.raise_for_status()
-        time.sleep(2)
-        image_cache_path.write_bytes(response.content)
+        try:
+            response = requests.get(image_url, timeout=get_timeout())
+            response.raise_for_status()
+        except requests.RequestException as ex:
+            logging.warning(
+                f"anidb: failed to fetch picture for {anime_id}: {ex}"
+            )
+            return None
+        sleep(2)
+        anidb_cache.put(image_cache_key, response.content)
 
     return AniDBInfo(
         id=anime_id,
@@ -90,4 +131,15 @@ def get_anidb_info(anime_id: int) -> T.Optional[AniDBInfo]:
         synopsis=process_synopsis(doc.get_text(".//description")),
         start_date=process_date(doc.get_text(".//startdate")),
         end_date=process_date(doc.get_text(".//enddate")),
+        fetched=datetime.fromtimestamp(
+            entry_cache_path.stat().st_mtime, timezone.utc
+        ),
     )
+
+
+def collect_anidb_cache_garbage(anime_ids: T.Iterable[int]) -> None:
+    referenced = {
+        key for anime_id in anime_ids for key in _get_cache_keys(anime_id)
+    }
+    anidb_cache.pin(referenced)
+    anidb_cache.collect_garbage(lambda key: key in referenced)
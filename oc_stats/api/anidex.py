@@ -1,5 +1,4 @@
 import logging
-import os
 import typing as T
 from dataclasses import dataclass
 from datetime import datetime
@@ -9,12 +8,13 @@ import lxml.html
 import requests
 from cachetools.func import ttl_cache
 
-ANIDEX_USER = os.environ["ANIDEX_USER"]
-ANIDEX_PASS = os.environ["ANIDEX_PASS"]
-ANIDEX_GROUP_ID = os.environ["ANIDEX_GROUP_ID"]
+from oc_stats.accounts import AnidexAccount, get_anidex_accounts
+from oc_stats.deadline import get_timeout
+from oc_stats.sessions import clear_session, load_session, save_session
+from oc_stats.shards import get_rate_limiter, map_shards
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Torrent:
     torrent_id: int
     website_link: str
@@ -32,35 +32,76 @@ class Torrent:
 
 
 def bypass_ddos_guard(session: requests.Session) -> None:
-    response = session.post("https://check.ddos-guard.net/check.js")
+    response = session.post(
+        "https://check.ddos-guard.net/check.js", timeout=get_timeout()
+    )
     response.raise_for_status()
     # make the cookies work across all domains
     for key, value in session.cookies.items():
         session.cookies.set_cookie(requests.cookies.create_cookie(key, value))
 
 
-@ttl_cache()
-def get_group_torrents() -> T.Iterable[Torrent]:
-    logging.info("anidex: fetching torrent list")
-    session = requests.Session()
-    bypass_ddos_guard(session)
+def _is_logged_in(tree: lxml.html.HtmlElement) -> bool:
+    return bool(tree.xpath('//a[contains(@href, "logout")]'))
+
 
+def _get_session_name(account: AnidexAccount) -> str:
+    return f"anidex-{account.name}"
+
+
+def _login(session: requests.Session, account: AnidexAccount) -> None:
+    session.cookies.clear()
+    bypass_ddos_guard(session)
     response = session.post(
         "https://anidex.info/ajax/actions.ajax.php?function=login",
         headers={"x-requested-with": "XMLHttpRequest"},
-        data={"login_username": ANIDEX_USER, "login_password": ANIDEX_PASS},
+        data={
+            "login_username": account.user,
+            "login_password": account.password,
+        },
+        timeout=get_timeout(),
     )
     response.raise_for_status()
 
+
+def _get_group_page(
+    session: requests.Session, account: AnidexAccount, offset: int
+) -> lxml.html.HtmlElement:
+    get_rate_limiter(account, account.request_interval).wait()
+    response = session.get(
+        "https://anidex.info/?page=group"
+        f"&id={account.group_id}&offset={offset}",
+        timeout=get_timeout(),
+    )
+    response.raise_for_status()
+    return lxml.html.fromstring(response.content)
+
+
+@ttl_cache()
+def get_group_torrents(account: AnidexAccount) -> T.Iterable[Torrent]:
+    logging.info(f"anidex: {account.name}: fetching torrent list")
+    session = load_session(_get_session_name(account))
+
+    tree: T.Optional[lxml.html.HtmlElement] = None
+    if session.cookies:
+        try:
+            tree = _get_group_page(session, account, 0)
+        except requests.HTTPError as ex:
+            logging.info(
+                f"anidex: {account.name}: stored session rejected: {ex}"
+            )
+    if tree is None or not _is_logged_in(tree):
+        logging.info(f"anidex: {account.name}: not logged in, logging in")
+        _login(session, account)
+        tree = _get_group_page(session, account, 0)
+        if _is_logged_in(tree):
+            save_session(_get_session_name(account), session)
+        else:
+            clear_session(_get_session_name(account), session)
+
     ret: list[Torrent] = []
     offset = 0
     while True:
-        response = session.get(
-            f"https://anidex.info/?page=group&id={ANIDEX_GROUP_ID}&offset={offset}"
-        )
-        response.raise_for_status()
-
-        tree = lxml.html.fromstring(response.content)
         done = 0
         for row in tree.xpath("//table/tbody/tr"):
             ret.append(_make_torrent(row))
@@ -69,10 +110,18 @@ def get_group_torrents() -> T.Iterable[Torrent]:
         if not done:
             break
         offset += done
+        tree = _get_group_page(session, account, offset)
 
     return ret
 
 
+def get_all_group_torrents() -> dict[AnidexAccount, list[Torrent]]:
+    return map_shards(
+        lambda account: list(get_group_torrents(account)),
+        get_anidex_accounts(),
+    )
+
+
 def _make_torrent(row: lxml.html.HtmlElement) -> Torrent:
     torrent_id = int(row.xpath(".//td[3]/a/@id")[0])
 
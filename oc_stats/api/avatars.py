@@ -0,0 +1,37 @@
+import hashlib
+import logging
+import typing as T
+from pathlib import Path
+
+import requests
+
+from oc_stats.cache import CacheManager
+from oc_stats.deadline import get_timeout
+
+avatar_cache = CacheManager("avatars", pinned=True)
+
+
+def _get_cache_key(url: str) -> str:
+    return hashlib.sha256(url.encode()).hexdigest()[:16]
+
+
+def get_avatar(url: str) -> T.Optional[Path]:
+    cache_key = _get_cache_key(url)
+    cache_path = avatar_cache.get(cache_key)
+    if cache_path:
+        return cache_path
+
+    logging.info(f"avatars: fetching {url}")
+    try:
+        response = requests.get(url, timeout=get_timeout())
+        response.raise_for_status()
+    except requests.RequestException as ex:
+        logging.warning(f"avatars: failed to fetch {url}: {ex}")
+        return None
+    return avatar_cache.put(cache_key, response.content)
+
+
+def collect_avatar_cache_garbage(urls: T.Iterable[str]) -> None:
+    referenced = {_get_cache_key(url) for url in urls}
+    avatar_cache.pin(referenced)
+    avatar_cache.collect_garbage(lambda key: key in referenced)
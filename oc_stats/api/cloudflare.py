@@ -1,19 +1,20 @@
 import logging
-import os
+import typing as T
 from dataclasses import dataclass
-from datetime import date, datetime, timedelta
+from datetime import date, timedelta
 
 import dateutil.parser
 import requests
 from cachetools.func import ttl_cache
 
-CLOUDFLARE_ZONE = os.environ["CLOUDFLARE_ZONE"]
-CLOUDFLARE_API_USER = os.environ["CLOUDFLARE_API_USER"]
-CLOUDFLARE_API_KEY = os.environ["CLOUDFLARE_API_KEY"]
+from oc_stats.accounts import CloudflareZone
+from oc_stats.deadline import get_timeout
+
 CLOUDFLARE_API_URL = "https://api.cloudflare.com/client/v4/graphql"
+CLOUDFLARE_MAX_DAYS_PER_QUERY = 30
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TrafficStat:
     requests: int
     page_views: int
@@ -21,19 +22,20 @@ class TrafficStat:
 
 
 @ttl_cache()
-def get_recent_hits() -> dict[date, TrafficStat]:
-    logging.info("cloudflare: fetching hit stats")
-
-    start = datetime.today().date() - timedelta(days=10)
-    end = datetime.today().date() + timedelta(days=1)
+def get_hits(
+    zone: CloudflareZone, start: date, end: date
+) -> dict[date, TrafficStat]:
+    logging.info(
+        f"cloudflare: {zone.name}: fetching hit stats for {start}..{end}"
+    )
 
     query = """{
     viewer {
         zones(filter: {zoneTag: "%s"}) {
             httpRequests1dGroups(
-                orderBy: [date_DESC]
-                limit: 1000
-                filter: {date_gt: "%s", date_lt: "%s"}
+                orderBy: [date_ASC]
+                limit: %d
+                filter: {date_geq: "%s", date_leq: "%s"}
             ) {
                 date: dimensions {
                     date
@@ -48,7 +50,8 @@ def get_recent_hits() -> dict[date, TrafficStat]:
     }
 }
     """ % (
-        CLOUDFLARE_ZONE,
+        zone.zone,
+        CLOUDFLARE_MAX_DAYS_PER_QUERY,
         start,
         end,
     )
@@ -56,11 +59,12 @@ def get_recent_hits() -> dict[date, TrafficStat]:
     response = requests.post(
         CLOUDFLARE_API_URL,
         headers={
-            "X-Auth-Email": CLOUDFLARE_API_USER,
-            "X-Auth-Key": CLOUDFLARE_API_KEY,
+            "X-Auth-Email": zone.api_user,
+            "X-Auth-Key": zone.api_key,
             "Content-Type": "application/json",
         },
         json={"query": query},
+        timeout=get_timeout(),
     )
     response.raise_for_status()
 
@@ -74,3 +78,16 @@ def get_recent_hits() -> dict[date, TrafficStat]:
             unique_visitors=item["uniq"]["uniques"],
         )
     return ret
+
+
+def iter_hits(
+    zone: CloudflareZone, start: date, end: date
+) -> T.Iterable[tuple[date, TrafficStat]]:
+    chunk_start = start
+    while chunk_start <= end:
+        chunk_end = min(
+            end,
+            chunk_start + timedelta(days=CLOUDFLARE_MAX_DAYS_PER_QUERY - 1),
+        )
+        yield from get_hits(zone, chunk_start, chunk_end).items()
+        chunk_start = chunk_end + timedelta(days=1)
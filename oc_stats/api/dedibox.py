@@ -10,11 +10,14 @@ from datetime import datetime, timedelta, timezone
 
 import dateutil.parser
 
+from oc_stats.deadline import get_timeout
+
 DEDIBOX_HOST = "oc"
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Comment:
+    comment_id: str
     website_link: T.Optional[str]
     comment_date: datetime
     author_name: str
@@ -22,7 +25,7 @@ class Comment:
     text: str
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TransmissionStats:
     raw_data: dict[str, T.Any]
 
@@ -51,7 +54,7 @@ class TransmissionStats:
         )
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class AnimeRequest:
     date: T.Optional[datetime]
     title: str
@@ -66,19 +69,20 @@ class AnimeRequest:
         return int(match.group(1))
 
 
-def get_transmission_stats() -> TransmissionStats:
-    logging.info("dedibox: fetching transmission stats")
-
-    content = subprocess.run(
-        [
-            "ssh",
-            DEDIBOX_HOST,
-            "curl 'http://127.0.0.1:9091/transmission/rpc' -siI",
-        ],
+def _ssh(*args: str) -> str:
+    return subprocess.run(
+        ["ssh", DEDIBOX_HOST, *args],
         check=True,
         stdout=subprocess.PIPE,
+        timeout=get_timeout(),
     ).stdout.decode()
 
+
+def get_transmission_stats() -> TransmissionStats:
+    logging.info("dedibox: fetching transmission stats")
+
+    content = _ssh("curl 'http://127.0.0.1:9091/transmission/rpc' -siI")
+
     match = re.search(r"X-Transmission-Session-Id: (\S+)", content)
     assert match
     transmission_session_id = match.group(1)
@@ -98,11 +102,7 @@ def get_transmission_stats() -> TransmissionStats:
         ]
     )
 
-    content = subprocess.run(
-        ["ssh", DEDIBOX_HOST, command],
-        check=True,
-        stdout=subprocess.PIPE,
-    ).stdout.decode()
+    content = _ssh(command)
 
     stats = json.loads(content)["arguments"]
     return TransmissionStats(raw_data=stats)
@@ -110,11 +110,7 @@ def get_transmission_stats() -> TransmissionStats:
 
 def get_guestbook_comments() -> T.Iterable[Comment]:
     logging.info("dedibox: fetching guestbook comments")
-    content = subprocess.run(
-        ["ssh", DEDIBOX_HOST, "cat", "srv/website/data/comments.jsonl"],
-        check=True,
-        stdout=subprocess.PIPE,
-    ).stdout.decode()
+    content = _ssh("cat", "srv/website/data/comments.jsonl")
 
     for row in content.splitlines():
         item = json.loads(row)
@@ -123,6 +119,7 @@ def get_guestbook_comments() -> T.Iterable[Comment]:
         ).hexdigest()
         avatar_url = f"https://www.gravatar.com/avatar/{chksum}?d=retro"
         yield Comment(
+            comment_id=str(item["id"]),
             website_link=f"https://oldcastle.moe/guest_book.html#comment-{item['id']}",
             comment_date=dateutil.parser.parse(item["created"]).replace(
                 tzinfo=timezone.utc
@@ -135,11 +132,7 @@ def get_guestbook_comments() -> T.Iterable[Comment]:
 
 def get_anime_requests() -> T.Iterable[AnimeRequest]:
     logging.info("dedibox: fetching anime requests")
-    content = subprocess.run(
-        ["ssh", DEDIBOX_HOST, "cat", "srv/website/data/requests.jsonl"],
-        check=True,
-        stdout=subprocess.PIPE,
-    ).stdout.decode()
+    content = _ssh("cat", "srv/website/data/requests.jsonl")
 
     for row in content.splitlines():
         item = json.loads(row)
@@ -1,21 +1,31 @@
+import io
 import logging
 import os
+import time
 import typing as T
 from dataclasses import dataclass
 from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import quote
+from xml.etree import ElementTree
 
 import humanfriendly
 import lxml.html
 import requests
 from cachetools.func import ttl_cache
 
-from oc_stats.common import CACHE_DIR
+from oc_stats.accounts import NyaaSiAccount, get_nyaa_si_accounts
+from oc_stats.cache import CacheManager
+from oc_stats.deadline import get_timeout
+from oc_stats.sessions import clear_session, load_session, save_session
+from oc_stats.shards import get_rate_limiter, map_shards
 
-NYAA_SI_USER = os.environ["NYAA_SI_USER"]
-NYAA_SI_PASS = os.environ["NYAA_SI_PASS"]
+NYAA_NS = "{https://nyaa.si/xmlns/nyaa}"
 
+torrent_cache = CacheManager("nyaasi")
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class Torrent:
     torrent_id: int
     website_link: str
@@ -31,8 +41,10 @@ class Torrent:
     visible: bool
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Comment:
+    torrent_id: int
+    comment_id: int
     website_title: T.Optional[str]
     website_link: T.Optional[str]
     comment_date: datetime
@@ -41,40 +53,95 @@ class Comment:
     text: str
 
 
-@ttl_cache()
-def get_user_torrents() -> T.Iterable[Torrent]:
-    logging.info("nyaa.si: fetching torrent list")
-    session = requests.Session()
-
-    # failed logins do not mean a fatal error, we'll just lose information
-    # about hidden torrents
-    try:
-        response = session.get("https://nyaa.si/login")
-        response.raise_for_status()
-        tree = lxml.html.fromstring(response.content)
-        csrf_token = tree.xpath('//input[@id="csrf_token"]/@value')[0]
-        response = session.post(
-            "https://nyaa.si/login",
-            data={
-                "username": NYAA_SI_USER,
-                "password": NYAA_SI_PASS,
-                "csrf_token": csrf_token,
-            },
+@dataclass
+class _TransferStats:
+    request_count: int = 0
+    byte_count: int = 0
+
+
+def _is_logged_in(tree: lxml.html.HtmlElement) -> bool:
+    return bool(tree.xpath('//a[contains(@href, "/logout")]'))
+
+
+def _get_session_name(account: NyaaSiAccount) -> str:
+    return f"nyaa.si-{account.name}"
+
+
+def _login(session: requests.Session, account: NyaaSiAccount) -> None:
+    session.cookies.clear()
+    response = session.get("https://nyaa.si/login", timeout=get_timeout())
+    response.raise_for_status()
+    tree = lxml.html.fromstring(response.content)
+    csrf_token = tree.xpath('//input[@id="csrf_token"]/@value')[0]
+    response = session.post(
+        "https://nyaa.si/login",
+        data={
+            "username": account.user,
+            "password": account.password,
+            "csrf_token": csrf_token,
+        },
+        timeout=get_timeout(),
+    )
+    response.raise_for_status()
+
+
+def _fetch(
+    session: requests.Session,
+    account: NyaaSiAccount,
+    url: str,
+    stats: _TransferStats,
+) -> bytes:
+    get_rate_limiter(account, account.request_interval).wait()
+    response = session.get(url, timeout=get_timeout())
+    response.raise_for_status()
+    stats.request_count += 1
+    stats.byte_count += len(response.content)
+    return response.content
+
+
+def _get_listing_page(
+    session: requests.Session,
+    account: NyaaSiAccount,
+    page: int,
+    stats: _TransferStats,
+) -> lxml.html.HtmlElement:
+    return lxml.html.fromstring(
+        _fetch(
+            session,
+            account,
+            f"https://nyaa.si/user/{account.user}?s=id&o=desc&page={page}",
+            stats,
         )
-        response.raise_for_status()
-    except Exception as ex:
-        logging.exception(ex)
+    )
+
+
+def _get_first_listing_page(
+    session: requests.Session, account: NyaaSiAccount, stats: _TransferStats
+) -> lxml.html.HtmlElement:
+    tree = _get_listing_page(session, account, 1, stats)
+    if not _is_logged_in(tree):
+        logging.info(f"nyaa.si: {account.name}: not logged in, logging in")
+        # failed logins do not mean a fatal error, we'll just lose information
+        # about hidden torrents
+        try:
+            _login(session, account)
+            tree = _get_listing_page(session, account, 1, stats)
+        except Exception as ex:
+            logging.exception(ex)
+        if _is_logged_in(tree):
+            save_session(_get_session_name(account), session)
+        else:
+            clear_session(_get_session_name(account), session)
+    return tree
 
+
+def _list_torrents_html(
+    session: requests.Session, account: NyaaSiAccount, stats: _TransferStats
+) -> list[Torrent]:
+    tree = _get_first_listing_page(session, account, stats)
     ret: list[Torrent] = []
     page = 1
-    page_count = float("inf")
-    while page <= page_count:
-        response = session.get(
-            f"https://nyaa.si/user/{NYAA_SI_USER}?s=id&o=desc&page={page}"
-        )
-        response.raise_for_status()
-
-        tree = lxml.html.fromstring(response.content)
+    while True:
         for row in tree.xpath("//table/tbody/tr"):
             ret.append(_make_torrent(row))
 
@@ -83,15 +150,101 @@ def get_user_torrents() -> T.Iterable[Torrent]:
                 '//ul[@class="pagination"]/li[position()=last()-1]/a/text()'
             )[0]
         )
+        if page >= page_count:
+            break
+        page += 1
+        tree = _get_listing_page(session, account, page, stats)
+
+    return ret
+
+
+def _list_torrents_rss(
+    session: requests.Session, account: NyaaSiAccount, stats: _TransferStats
+) -> list[Torrent]:
+    torrents: dict[int, Torrent] = {}
+    page = 1
+    while True:
+        content = _fetch(
+            session,
+            account,
+            f"https://nyaa.si/?page=rss&u={quote(account.user)}&p={page}",
+            stats,
+        )
+        new_count = 0
+        for torrent in _iter_feed_torrents(content):
+            if torrent.torrent_id not in torrents:
+                torrents[torrent.torrent_id] = torrent
+                new_count += 1
+        if not new_count:
+            break
         page += 1
 
+    # the feed only lists public torrents; the logged-in listing also
+    # shows the hidden ones, which are usually the most recent uploads
+    tree = _get_first_listing_page(session, account, stats)
+    for row in tree.xpath("//table/tbody/tr"):
+        torrent = _make_torrent(row)
+        torrents[torrent.torrent_id] = torrent
+
+    return sorted(
+        torrents.values(),
+        key=lambda torrent: torrent.torrent_id,
+        reverse=True,
+    )
+
+
+LISTING_STRATEGIES = {
+    "html": _list_torrents_html,
+    "rss": _list_torrents_rss,
+}
+
+
+@ttl_cache()
+def get_user_torrents(account: NyaaSiAccount) -> T.Iterable[Torrent]:
+    strategy = os.environ.get("NYAA_SI_LISTING", "html")
+    logging.info(
+        f"nyaa.si: {account.name}: fetching torrent list ({strategy})"
+    )
+    session = load_session(_get_session_name(account))
+    stats = _TransferStats()
+    start = time.perf_counter()
+    ret = LISTING_STRATEGIES[strategy](session, account, stats)
+    logging.info(
+        f"nyaa.si: {account.name}: listed {len(ret)} torrents in "
+        f"{time.perf_counter() - start:.2f}s "
+        f"({stats.request_count} requests, "
+        f"{humanfriendly.format_size(stats.byte_count)})"
+    )
     return ret
 
 
-def get_torrent_comments(torrent: Torrent) -> T.Iterable[Comment]:
-    cache_path = CACHE_DIR / "nyaasi" / f"torrent-{torrent.torrent_id}.txt"
+def get_all_user_torrents() -> dict[NyaaSiAccount, list[Torrent]]:
+    return map_shards(
+        lambda account: list(get_user_torrents(account)),
+        get_nyaa_si_accounts(),
+    )
+
 
-    if cache_path.exists():
+def _get_torrent_cache_key(torrent: Torrent) -> str:
+    return f"torrent-{torrent.torrent_id}-{torrent.comment_count}.txt"
+
+
+def get_torrent_comments_age(torrent: Torrent) -> T.Optional[float]:
+    return torrent_cache.get_age(_get_torrent_cache_key(torrent))
+
+
+def get_torrent_comments(
+    torrent: Torrent, max_age: T.Optional[float] = None
+) -> T.Iterable[Comment]:
+    cache_key = _get_torrent_cache_key(torrent)
+    cache_age = torrent_cache.get_age(cache_key)
+    cache_path = (
+        torrent_cache.get(cache_key)
+        if cache_age is not None and (max_age is None or cache_age <= max_age)
+        else None
+    )
+
+    if cache_path:
         logging.info(
             f"nyaa.si: using cached torrent info for {torrent.torrent_id}"
         )
@@ -100,11 +253,13 @@ def get_torrent_comments(torrent: Torrent) -> T.Iterable[Comment]:
         logging.info(
             f"nyaa.si: fetching torrent info for {torrent.torrent_id}"
         )
-        response = requests.get(f"https://nyaa.si/view/{torrent.torrent_id}")
+        response = requests.get(
+            f"https://nyaa.si/view/{torrent.torrent_id}",
+            timeout=get_timeout(),
+        )
         response.raise_for_status()
         content = response.text
-        cache_path.parent.mkdir(parents=True, exist_ok=True)
-        cache_path.write_text(content)
+        torrent_cache.put(cache_key, content)
 
     ret: list[Comment] = []
     tree = lxml.html.fromstring(content)
@@ -113,13 +268,22 @@ def get_torrent_comments(torrent: Torrent) -> T.Iterable[Comment]:
     ):
         ret.append(_make_comment(torrent, row))
 
+    # keep mismatching pages cached: the comments builder retries them once
+    # they get old, like any other page, instead of on every run
     if torrent.comment_count != len(ret):
-        cache_path.unlink()
-        return get_torrent_comments(torrent)
+        logging.warning(
+            f"nyaa.si: torrent {torrent.torrent_id} lists "
+            f"{torrent.comment_count} comments but shows {len(ret)}"
+        )
 
     return ret
 
 
+def collect_torrent_cache_garbage(torrents: T.Iterable[Torrent]) -> None:
+    referenced = {_get_torrent_cache_key(torrent) for torrent in torrents}
+    torrent_cache.collect_garbage(lambda key: key in referenced)
+
+
 def _make_torrent(row: lxml.html.HtmlElement) -> Torrent:
     torrent_id = int(
         row.xpath(".//td[2]/a[last()]/@href")[0].replace("/view/", "")
@@ -145,13 +309,43 @@ def _make_torrent(row: lxml.html.HtmlElement) -> Torrent:
     )
 
 
+def _iter_feed_torrents(content: bytes) -> T.Iterator[Torrent]:
+    for _event, item in ElementTree.iterparse(io.BytesIO(content)):
+        if item.tag != "item":
+            continue
+        torrent_id = int(item.findtext("guid", "").rsplit("/", 1)[-1])
+        name = item.findtext("title", "")
+        yield Torrent(
+            torrent_id=torrent_id,
+            name=name,
+            website_link=f"https://nyaa.si/view/{torrent_id}",
+            torrent_link=f"https://nyaa.si/download/{torrent_id}.torrent",
+            magnet_link=(
+                f"magnet:?xt=urn:btih:{item.findtext(NYAA_NS + 'infoHash')}"
+                f"&dn={quote(name)}"
+            ),
+            size=humanfriendly.parse_size(
+                item.findtext(NYAA_NS + "size", "0")
+            ),
+            upload_date=parsedate_to_datetime(
+                item.findtext("pubDate", "")
+            ).astimezone(timezone.utc),
+            seeder_count=int(item.findtext(NYAA_NS + "seeders", "0")),
+            leecher_count=int(item.findtext(NYAA_NS + "leechers", "0")),
+            download_count=int(item.findtext(NYAA_NS + "downloads", "0")),
+            comment_count=int(item.findtext(NYAA_NS + "comments", "0")),
+            visible=True,
+        )
+        item.clear()
+
+
 def _make_comment(torrent: Torrent, row: lxml.html.HtmlElement) -> Comment:
+    anchor = row.xpath('.//a[contains(@href, "#com-")]/@href')[0]
     return Comment(
+        torrent_id=torrent.torrent_id,
+        comment_id=int(anchor.split("#com-")[1]),
         website_title=torrent.name,
-        website_link=(
-            torrent.website_link
-            + row.xpath('.//a[contains(@href, "#com-")]/@href')[0]
-        ),
+        website_link=torrent.website_link + anchor,
         comment_date=(
             datetime(
                 *humanfriendly.parse_date(
@@ -1,19 +1,560 @@
-from flask import Flask, render_template
+import functools
+import hashlib
+import logging
+import mimetypes
+import threading
+import time
+import typing as T
+from dataclasses import dataclass
 
-from oc_stats.context import BaseContextBuilder
+import humanfriendly
+from flask import (
+    Flask,
+    Response,
+    abort,
+    jsonify,
+    render_template,
+    request,
+    send_from_directory,
+    stream_with_context,
+)
+
+from oc_stats.assets import ASSETS_DIR, get_manifest
+from oc_stats.common import PROJ_DIR
+from oc_stats.encoding import (
+    ENCODING_SUFFIXES,
+    STREAM_BROTLI_QUALITY,
+    STREAM_GZIP_LEVEL,
+    compress,
+    compress_stream,
+    negotiate_encoding,
+)
+from oc_stats.events import Broadcaster, UpdateWatcher, iter_events
+from oc_stats.fragments import FragmentCache
 from oc_stats.jinja_env import setup_jinja_env
+from oc_stats.profiling import REQUEST_THRESHOLD, profile
 from oc_stats.repo import ContextBuilderRepository
+from oc_stats.search import SEARCH_COLUMNS, search
+from oc_stats.snapshot import Snapshot, SnapshotReader, write_snapshot
+
+TEMPLATES_DIR = PROJ_DIR / "templates"
+IMMUTABLE_STATIC_PREFIXES = ["/static/thumbnails/", "/assets/"]
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+SEARCH_PER_PAGE = 20
+STREAM_CHUNK_SIZE = 16 * 1024
+EVENTS_POLL_INTERVAL = 1.0
+EVENTS_KEEPALIVE_INTERVAL = 15.0
+EVENTS_RETRY_MS = 5000
+EVENTS_STREAM_LIFETIME = 600.0
+PAGE_SECTIONS: dict[str, tuple[str, ...]] = {
+    "stale_alert": ("update_status",),
+    "daily_stats": (
+        "daily_traffic_stats",
+        "daily_anidex_stats",
+        "daily_nyaa_si_stats",
+        "torrents",
+    ),
+    "recent_comments": ("comments",),
+    "torrent_stats": ("torrents",),
+    "transmission_stats": ("transmission_stats",),
+    "recent_requests": ("anime_requests",),
+    "all_comments": ("comments",),
+    "all_requests": ("anime_requests",),
+}
+
+
+@dataclass
+class RenderedPage:
+    version: str
+    bodies: dict[str, T.Union[bytes, memoryview]]
+
+
+class PageRender:
+    def __init__(self, version: str) -> None:
+        self.version = version
+        self.chunks: list[bytes] = []
+        self.done = False
+        self.error: T.Optional[Exception] = None
+        self.condition = threading.Condition()
+
+    def append(self, chunk: bytes) -> None:
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self) -> None:
+        with self.condition:
+            self.done = True
+            self.condition.notify_all()
+
+    def iter_chunks(self) -> T.Iterator[bytes]:
+        index = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(
+                    lambda: self.done or index < len(self.chunks)
+                )
+                chunks = self.chunks[index:]
+                done = self.done
+            index += len(chunks)
+            yield from chunks
+            if done:
+                break
+        if self.error:
+            raise self.error
+
 
 app = Flask(__name__)
-setup_jinja_env(app.jinja_env)
+fragment_cache = FragmentCache(get_version=lambda: get_templates_version())
+setup_jinja_env(app.jinja_env, fragment_cache)
+
+
+@app.after_request
+def add_cache_headers(response: Response) -> Response:
+    if response.status_code == 200 and any(
+        request.path.startswith(prefix) for prefix in IMMUTABLE_STATIC_PREFIXES
+    ):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    return response
+
+
+@app.route("/assets/<path:filename>")
+def app_asset(filename: str) -> Response:
+    available = [
+        encoding
+        for encoding, suffix in ENCODING_SUFFIXES.items()
+        if (ASSETS_DIR / (filename + suffix)).exists()
+    ]
+    encoding = negotiate_encoding(request.accept_encodings, available)
+    response = send_from_directory(
+        ASSETS_DIR,
+        filename + ENCODING_SUFFIXES[encoding] if encoding else filename,
+        mimetype=mimetypes.guess_type(filename)[0],
+    )
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add("Accept-Encoding")
+    return response
+
+
+page_repo = ContextBuilderRepository()
+snapshot_reader = SnapshotReader()
+page_repo_version: T.Optional[str] = None
+page_repo_lock = threading.Lock()
+page_cache: T.Optional[RenderedPage] = None
+page_render: T.Optional[PageRender] = None
+page_cache_lock = threading.Lock()
+broadcaster = Broadcaster()
+watcher: T.Optional[UpdateWatcher] = None
+watcher_lock = threading.Lock()
+
+
+def get_templates_version() -> str:
+    # templates are only re-read from disk when auto-reload is enabled
+    signature = (
+        tuple(
+            (path.name, path.stat().st_mtime_ns)
+            for path in sorted(TEMPLATES_DIR.iterdir())
+        )
+        if app.jinja_env.auto_reload
+        else None
+    )
+    return _get_templates_version(signature)
+
+
+@functools.lru_cache(maxsize=1)
+def _get_templates_version(
+    signature: T.Optional[tuple[tuple[str, int], ...]]
+) -> str:
+    digest = hashlib.sha256()
+    for path in sorted(TEMPLATES_DIR.iterdir()):
+        digest.update(path.read_bytes())
+    for hashed_name in get_manifest().values():
+        digest.update(hashed_name.encode())
+    return digest.hexdigest()[:16]
+
+
+def get_section_digests(data_digests: dict[str, str]) -> dict[str, str]:
+    return {
+        name: hashlib.sha256(
+            "".join(
+                f"{key}:{data_digests.get(key, '')}\0" for key in keys
+            ).encode()
+        ).hexdigest()[:16]
+        for name, keys in PAGE_SECTIONS.items()
+    }
+
+
+def get_page_context(
+    repo: ContextBuilderRepository, version: str, digests: dict[str, str]
+) -> dict[str, T.Any]:
+    return {
+        **repo.build_context(),
+        "page_version": version,
+        "section_digests": get_section_digests(digests),
+    }
+
+
+def render_page(version: str, context: dict[str, T.Any]) -> RenderedPage:
+    body = render_template("home.html", **context).encode()
+    return RenderedPage(
+        version=version, bodies={"identity": body, **compress(body)}
+    )
+
+
+def render_section(name: str, context: dict[str, T.Any]) -> bytes:
+    return b"".join(iter_section_chunks(name, context))
+
+
+def publish_snapshot(repo: ContextBuilderRepository) -> None:
+    version = f"{get_templates_version()}-{repo.get_data_version()}"
+    digests = repo.get_data_digests()
+    entries: dict[str, T.Union[bytes, memoryview]] = {}
+    with app.test_request_context():
+        context = get_page_context(repo, version, digests)
+        page = render_page(version, context)
+        entries.update(
+            (f"home/{encoding}", body)
+            for encoding, body in page.bodies.items()
+        )
+        for name in PAGE_SECTIONS:
+            body = render_section(name, context)
+            entries.update(
+                (f"sections/{name}/{encoding}", data)
+                for encoding, data in {
+                    "identity": body,
+                    **compress(
+                        body,
+                        brotli_quality=STREAM_BROTLI_QUALITY,
+                        gzip_level=STREAM_GZIP_LEVEL,
+                    ),
+                }.items()
+            )
+    write_snapshot(version, entries, digests)
+
+
+def get_page_version() -> str:
+    return f"{get_templates_version()}-{page_repo.get_data_version()}"
+
+
+@functools.lru_cache(maxsize=1)
+def get_page_digests(version: str) -> dict[str, str]:
+    return page_repo.get_data_digests()
+
+
+def load_page_repo(version: str) -> None:
+    global page_repo_version
+    if page_repo_version != version:
+        page_repo.load_data()
+        page_repo_version = version
+
+
+def get_current_snapshot() -> T.Optional[Snapshot]:
+    snapshot = snapshot_reader.current()
+    if snapshot and snapshot.version.startswith(f"{get_templates_version()}-"):
+        return snapshot
+    return None
+
+
+def get_snapshot_bodies(
+    snapshot: Snapshot, prefix: str
+) -> dict[str, T.Union[bytes, memoryview]]:
+    return {
+        name.rsplit("/", 1)[1]: body
+        for name in snapshot.entries
+        if name.startswith(f"{prefix}/")
+        and (body := snapshot.get(name)) is not None
+    }
 
-context_builders = [cls() for cls in BaseContextBuilder.__subclasses__()]
+
+def get_cached_page() -> T.Optional[RenderedPage]:
+    snapshot = get_current_snapshot()
+    if snapshot:
+        return RenderedPage(
+            version=snapshot.version,
+            bodies=get_snapshot_bodies(snapshot, "home"),
+        )
+
+    page = page_cache
+    if page is not None and page.version == get_page_version():
+        return page
+    return None
+
+
+def buffer_chunks(texts: T.Iterable[str]) -> T.Iterator[bytes]:
+    buffer: list[bytes] = []
+    size = 0
+    for text in texts:
+        data = text.encode()
+        buffer.append(data)
+        size += len(data)
+        if size >= STREAM_CHUNK_SIZE:
+            yield b"".join(buffer)
+            buffer.clear()
+            size = 0
+            # rendering never blocks on I/O; under gevent this is where
+            # other greenlets (e.g. event streams) get to run
+            time.sleep(0)
+    if buffer:
+        yield b"".join(buffer)
+
+
+def iter_rendered_chunks(context: dict[str, T.Any]) -> T.Iterator[bytes]:
+    app.update_template_context(context)
+    template = app.jinja_env.get_template("home.html")
+    yield from buffer_chunks(template.generate(context))
+
+
+def iter_section_chunks(
+    name: str, context: dict[str, T.Any]
+) -> T.Iterator[bytes]:
+    app.update_template_context(context)
+    template = app.jinja_env.get_template("home.html")
+    yield from buffer_chunks(
+        template.blocks[name](template.new_context(context))
+    )
+
+
+def collect_chunks(
+    chunks: T.Iterable[bytes], sink: bytearray
+) -> T.Iterator[bytes]:
+    for chunk in chunks:
+        sink.extend(chunk)
+        yield chunk
+
+
+def log_fragment_stats() -> None:
+    stats = fragment_cache.get_stats()
+    logging.info(
+        f"app: fragments: {stats.hit_count} hits, "
+        f"{stats.miss_count} misses, "
+        f"{stats.entry_count} entries, "
+        f"{humanfriendly.format_size(stats.total_size)}"
+    )
+
+
+def run_page_render(render: PageRender) -> None:
+    global page_cache, page_render
+    try:
+        with app.test_request_context(), profile(
+            "app_home", threshold=REQUEST_THRESHOLD
+        ):
+            with page_repo_lock:
+                load_page_repo(render.version)
+                context = get_page_context(
+                    page_repo, render.version, get_page_digests(render.version)
+                )
+            for chunk in iter_rendered_chunks(context):
+                render.append(chunk)
+        body = b"".join(render.chunks)
+        page = RenderedPage(
+            version=render.version,
+            bodies={
+                "identity": body,
+                **compress(
+                    body,
+                    brotli_quality=STREAM_BROTLI_QUALITY,
+                    gzip_level=STREAM_GZIP_LEVEL,
+                ),
+            },
+        )
+        with page_cache_lock:
+            # a newer version may have started rendering in the meantime
+            if page_render is render:
+                page_cache = page
+        log_fragment_stats()
+    except Exception as ex:
+        logging.exception(ex)
+        render.error = ex
+    finally:
+        with page_cache_lock:
+            if page_render is render:
+                page_render = None
+        render.finish()
+
+
+def iter_rendered_page(
+    version: str, encoding: T.Optional[str]
+) -> T.Iterator[bytes]:
+    global page_render
+    render: T.Optional[PageRender] = None
+    with page_cache_lock:
+        page = page_cache
+        if page is None or page.version != version:
+            render = page_render
+            if render is None or render.version != version:
+                # render in the background so that a slow client only
+                # delays itself; every request for this version streams
+                # the same chunks as they are produced
+                render = page_render = PageRender(version=version)
+                threading.Thread(
+                    target=run_page_render,
+                    args=(render,),
+                    name="page-render",
+                    daemon=True,
+                ).start()
+
+    if render:
+        chunks = render.iter_chunks()
+        yield from compress_stream(chunks, encoding) if encoding else chunks
+        return
+
+    assert page
+    if encoding and encoding not in page.bodies:
+        yield from compress_stream(
+            iter_chunks(page.bodies["identity"]), encoding
+        )
+    else:
+        yield from iter_chunks(page.bodies[encoding or "identity"])
+
+
+def iter_chunks(
+    data: T.Union[bytes, memoryview], chunk_size: int = 64 * 1024
+) -> T.Iterator[bytes]:
+    view = memoryview(data)
+    for offset in range(0, len(view), chunk_size):
+        yield bytes(view[offset : offset + chunk_size])
 
 
 @app.route("/")
 @app.route("/index.html")
-def app_home() -> str:
-    repo = ContextBuilderRepository()
-    repo.load_data()
-    context = repo.build_context()
-    return render_template("home.html", **context)
+def app_home() -> Response:
+    page = get_cached_page()
+    if page is None:
+        return stream_page()
+
+    return make_cached_response(page.bodies, page.version)
+
+
+def make_cached_response(
+    bodies: dict[str, T.Union[bytes, memoryview]], version: str
+) -> Response:
+    encoding = negotiate_encoding(
+        request.accept_encodings,
+        [encoding for encoding in bodies if encoding != "identity"],
+    )
+    body = bodies[encoding or "identity"]
+    response = Response(iter_chunks(body), mimetype="text/html")
+    response.content_length = len(body)
+    if encoding:
+        response.content_encoding = encoding
+    response.set_etag(f"{version}-{encoding or 'identity'}")
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+
+def stream_page() -> Response:
+    version = get_page_version()
+    encoding = negotiate_encoding(request.accept_encodings, ENCODING_SUFFIXES)
+    response = Response(
+        stream_with_context(iter_rendered_page(version, encoding)),
+        mimetype="text/html",
+    )
+    if encoding:
+        response.content_encoding = encoding
+    # no ETag: the render may still fail halfway through the body, and a
+    # truncated page must not be revalidated against a later complete one
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = True
+    return response
+
+
+@app.route("/sections/<name>")
+def app_section(name: str) -> Response:
+    if name not in PAGE_SECTIONS:
+        abort(404)
+
+    snapshot = get_current_snapshot()
+    if snapshot:
+        bodies = get_snapshot_bodies(snapshot, f"sections/{name}")
+        if bodies:
+            response = make_cached_response(
+                bodies, f"{snapshot.version}-{name}"
+            )
+            response.headers["X-Section-Digest"] = get_section_digests(
+                snapshot.digests
+            )[name]
+            return response
+
+    version = get_page_version()
+    digests = get_page_digests(version)
+    encoding = negotiate_encoding(request.accept_encodings, ENCODING_SUFFIXES)
+
+    def generate() -> T.Iterator[bytes]:
+        with page_repo_lock:
+            load_page_repo(version)
+            context = get_page_context(page_repo, version, digests)
+        chunks = iter_section_chunks(name, context)
+        if encoding:
+            chunks = compress_stream(chunks, encoding)
+        yield from chunks
+
+    response = Response(stream_with_context(generate()), mimetype="text/html")
+    if encoding:
+        response.content_encoding = encoding
+    response.headers["X-Section-Digest"] = get_section_digests(digests)[name]
+    response.vary.add("Accept-Encoding")
+    response.cache_control.no_cache = True
+    return response
+
+
+def get_current_state() -> tuple[str, dict[str, str]]:
+    snapshot = get_current_snapshot()
+    if snapshot:
+        return snapshot.version, snapshot.digests
+    version = get_page_version()
+    return version, get_page_digests(version)
+
+
+def start_watcher() -> None:
+    global watcher
+    with watcher_lock:
+        if watcher is None:
+            watcher = UpdateWatcher(
+                broadcaster,
+                get_current_state,
+                get_section_digests,
+                EVENTS_POLL_INTERVAL,
+            )
+            watcher.start()
+
+
+@app.route("/events")
+def app_events() -> Response:
+    start_watcher()
+    response = Response(
+        iter_events(
+            broadcaster,
+            EVENTS_KEEPALIVE_INTERVAL,
+            EVENTS_RETRY_MS,
+            EVENTS_STREAM_LIFETIME,
+        ),
+        mimetype="text/event-stream",
+    )
+    response.cache_control.no_cache = True
+    response.headers["X-Accel-Buffering"] = "no"
+    return response
+
+
+@app.route("/search")
+def app_search() -> Response:
+    kind = request.args.get("kind", "comments")
+    if kind not in SEARCH_COLUMNS:
+        abort(400)
+    page = max(request.args.get("page", 1, type=int), 1)
+    results, has_more = search(
+        kind,
+        request.args.get("q", ""),
+        page=page,
+        per_page=SEARCH_PER_PAGE,
+    )
+    return jsonify(
+        kind=kind,
+        page=page,
+        has_more=has_more,
+        results=results,
+    )
@@ -0,0 +1,58 @@
+import functools
+import hashlib
+import logging
+import os
+from pathlib import Path
+
+from flask import url_for
+
+from oc_stats.common import CACHE_DIR, STATIC_DIR
+from oc_stats.encoding import ENCODING_SUFFIXES, compress
+
+ASSETS_DIR = CACHE_DIR / "assets"
+
+
+def _write_atomic(path: Path, content: bytes) -> None:
+    # several workers may build the same manifest at once
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    tmp_path.write_bytes(content)
+    tmp_path.rename(path)
+
+
+def build_manifest() -> dict[str, str]:
+    ret: dict[str, str] = {}
+    for path in sorted(STATIC_DIR.iterdir()):
+        if path.is_symlink() or not path.is_file():
+            continue
+
+        content = path.read_bytes()
+        digest = hashlib.sha256(content).hexdigest()[:12]
+        hashed_name = f"{path.stem}.{digest}{path.suffix}"
+        ret[path.name] = hashed_name
+
+        target_path = ASSETS_DIR / hashed_name
+        if target_path.exists():
+            continue
+
+        logging.info(f"assets: building {hashed_name}")
+        ASSETS_DIR.mkdir(parents=True, exist_ok=True)
+        # the plain file goes last: its presence marks the set as complete
+        for encoding, compressed in compress(content).items():
+            _write_atomic(
+                target_path.with_name(
+                    hashed_name + ENCODING_SUFFIXES[encoding]
+                ),
+                compressed,
+            )
+        _write_atomic(target_path, content)
+
+    return ret
+
+
+@functools.cache
+def get_manifest() -> dict[str, str]:
+    return build_manifest()
+
+
+def asset_url(filename: str) -> str:
+    return url_for("app_asset", filename=get_manifest()[filename])
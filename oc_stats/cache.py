@@ -0,0 +1,260 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import typing as T
+from dataclasses import dataclass
+from pathlib import Path
+
+from oc_stats.common import CACHE_DIR
+
+CACHE_INDEX_PATH = CACHE_DIR / "index.sqlite3"
+CACHE_MAX_BYTES = int(
+    os.environ.get("OC_STATS_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    namespace TEXT NOT NULL,
+    key TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    accessed REAL NOT NULL,
+    pinned INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (namespace, key)
+);
+CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed);
+"""
+
+
+@dataclass(frozen=True, slots=True)
+class CacheStatsDTO:
+    namespace: str
+    entry_count: int
+    total_size: int
+
+
+class _CacheIndex:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock = threading.Lock()
+        self._db: T.Optional[sqlite3.Connection] = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(
+                self.path, check_same_thread=False, isolation_level=None
+            )
+            self._db.executescript(SCHEMA)
+            columns = {
+                name
+                for _cid, name, *_rest in self._db.execute(
+                    "PRAGMA table_info(entries)"
+                )
+            }
+            if "pinned" not in columns:
+                self._db.execute(
+                    "ALTER TABLE entries "
+                    "ADD COLUMN pinned INTEGER NOT NULL DEFAULT 0"
+                )
+        return self._db
+
+
+_index = _CacheIndex(CACHE_INDEX_PATH)
+
+
+class CacheManager:
+    def __init__(
+        self,
+        namespace: str,
+        max_bytes: T.Optional[int] = None,
+        pinned: bool = False,
+    ) -> None:
+        self.namespace = namespace
+        self.max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+        self.pinned = pinned
+        self.cache_dir = CACHE_DIR / namespace
+        self._synced = False
+
+    def get_path(self, key: str) -> Path:
+        return self.cache_dir / key
+
+    def _sync(self) -> None:
+        if self._synced:
+            return
+        self._synced = True
+        if not self.cache_dir.is_dir():
+            return
+        entries = [
+            (
+                self.namespace,
+                path.name,
+                stat.st_size,
+                stat.st_mtime,
+                self.pinned,
+            )
+            for path in self.cache_dir.iterdir()
+            if path.is_file()
+            and path.suffix != ".tmp"
+            and (stat := path.stat())
+        ]
+        with _index.lock:
+            known = {
+                key
+                for (key,) in _index.db.execute(
+                    "SELECT key FROM entries WHERE namespace = ?",
+                    (self.namespace,),
+                )
+            }
+            found = {entry[1] for entry in entries}
+            _index.db.execute("BEGIN")
+            _index.db.executemany(
+                "INSERT OR IGNORE INTO entries "
+                "(namespace, key, size, accessed, pinned) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (entry for entry in entries if entry[1] not in known),
+            )
+            _index.db.executemany(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                ((self.namespace, key) for key in known - found),
+            )
+            _index.db.execute("COMMIT")
+
+    def get(self, key: str) -> T.Optional[Path]:
+        self._sync()
+        path = self.get_path(key)
+        with _index.lock:
+            if not path.exists():
+                _index.db.execute(
+                    "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                    (self.namespace, key),
+                )
+                return None
+            _index.db.execute(
+                "UPDATE entries SET accessed = ? "
+                "WHERE namespace = ? AND key = ?",
+                (time.time(), self.namespace, key),
+            )
+        return path
+
+    def get_age(self, key: str) -> T.Optional[float]:
+        try:
+            return time.time() - self.get_path(key).stat().st_mtime
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: T.Union[str, bytes]) -> Path:
+        self._sync()
+        path = self.get_path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        if isinstance(data, str):
+            tmp_path.write_text(data)
+        else:
+            tmp_path.write_bytes(data)
+        tmp_path.rename(path)
+        with _index.lock:
+            _index.db.execute(
+                "INSERT INTO entries (namespace, key, size, accessed, pinned) "
+                "VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (namespace, key) DO UPDATE SET "
+                "size = excluded.size, accessed = excluded.accessed, "
+                "pinned = MAX(pinned, excluded.pinned)",
+                (
+                    self.namespace,
+                    key,
+                    path.stat().st_size,
+                    time.time(),
+                    self.pinned,
+                ),
+            )
+        self.evict(keep=key)
+        return path
+
+    def discard(self, key: str) -> None:
+        self.get_path(key).unlink(missing_ok=True)
+        with _index.lock:
+            _index.db.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?",
+                (self.namespace, key),
+            )
+
+    def evict(self, keep: T.Optional[str] = None) -> None:
+        with _index.lock:
+            (total_size,) = _index.db.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM entries WHERE NOT pinned"
+            ).fetchone()
+            if total_size <= self.max_bytes:
+                return
+            victims: list[tuple[str, str]] = []
+            for namespace, key, size in _index.db.execute(
+                "SELECT namespace, key, size FROM entries "
+                "WHERE NOT pinned ORDER BY accessed ASC"
+            ):
+                if total_size <= self.max_bytes:
+                    break
+                if (namespace, key) == (self.namespace, keep):
+                    continue
+                victims.append((namespace, key))
+                total_size -= size
+            self._delete(victims)
+        logging.info(f"cache: evicted {len(victims)} entries")
+
+    def collect_garbage(self, is_referenced: T.Callable[[str], bool]) -> None:
+        self._sync()
+        with _index.lock:
+            victims = [
+                (self.namespace, key)
+                for (key,) in _index.db.execute(
+                    "SELECT key FROM entries WHERE namespace = ?",
+                    (self.namespace,),
+                )
+                if not is_referenced(key)
+            ]
+            self._delete(victims)
+        if victims:
+            logging.info(
+                f"cache: removed {len(victims)} unreferenced entries "
+                f"from {self.namespace}"
+            )
+
+    def pin(self, keys: T.Iterable[str]) -> None:
+        self._sync()
+        now = time.time()
+        with _index.lock:
+            _index.db.execute("BEGIN")
+            _index.db.execute(
+                "UPDATE entries SET pinned = 0 WHERE namespace = ?",
+                (self.namespace,),
+            )
+            _index.db.executemany(
+                "UPDATE entries SET accessed = ?, pinned = 1 "
+                "WHERE namespace = ? AND key = ?",
+                ((now, self.namespace, key) for key in keys),
+            )
+            _index.db.execute("COMMIT")
+
+    @staticmethod
+    def _delete(victims: list[tuple[str, str]]) -> None:
+        for namespace, key in victims:
+            (CACHE_DIR / namespace / key).unlink(missing_ok=True)
+        _index.db.execute("BEGIN")
+        _index.db.executemany(
+            "DELETE FROM entries WHERE namespace = ? AND key = ?", victims
+        )
+        _index.db.execute("COMMIT")
+
+
+def get_cache_stats() -> list[CacheStatsDTO]:
+    with _index.lock:
+        return [
+            CacheStatsDTO(
+                namespace=namespace, entry_count=count, total_size=size
+            )
+            for namespace, count, size in _index.db.execute(
+                "SELECT namespace, COUNT(*), SUM(size) FROM entries "
+                "GROUP BY namespace ORDER BY namespace"
+            )
+        ]
@@ -0,0 +1,325 @@
+import json
+import math
+import typing as T
+from dataclasses import dataclass
+from datetime import date
+
+from markupsafe import Markup, escape
+
+CHART_WIDTH = 800
+CHART_HEIGHT = 300
+CHART_MARGIN_TOP = 10
+CHART_MARGIN_RIGHT = 50
+CHART_MARGIN_BOTTOM = 20
+CHART_MARGIN_LEFT = 50
+CHART_INNER_WIDTH = CHART_WIDTH - CHART_MARGIN_LEFT - CHART_MARGIN_RIGHT
+CHART_INNER_HEIGHT = CHART_HEIGHT - CHART_MARGIN_TOP - CHART_MARGIN_BOTTOM
+TICK_SIZE = 6
+TICK_PADDING = 3
+LEGEND_X = 12
+LEGEND_Y = 12
+LEGEND_WIDTH = 150
+LEGEND_PADDING = 8
+LEGEND_SQUARE_SIZE = 12
+LEGEND_SQUARE_SPACING = 8
+LEGEND_TEXT_SPACING = 5
+AXIS_ATTRS = "fill='none' font-size='10' font-family='sans-serif'"
+
+
+@dataclass(frozen=True, slots=True)
+class ChartSeries:
+    title: str
+    class_name: str
+    values: dict[date, T.Union[int, float]]
+    secondary: bool
+
+
+class _LinearScale:
+    def __init__(self, max_value: float, size: float) -> None:
+        self.step = _get_tick_step(max_value or 1)
+        self.max_value = math.ceil((max_value or 1) / self.step) * self.step
+        self.size = size
+
+    def __call__(self, value: float) -> float:
+        return self.size - value / self.max_value * self.size
+
+    def ticks(self) -> list[T.Union[int, float]]:
+        count = round(self.max_value / self.step)
+        return [_round_tick(idx * self.step) for idx in range(count + 1)]
+
+
+class _TimeScale:
+    def __init__(self, start: date, end: date, size: float) -> None:
+        self.start = start
+        self.days = max((end - start).days, 1)
+        self.size = size
+
+    def __call__(self, day: date) -> float:
+        return (day - self.start).days / self.days * self.size
+
+    def month_ticks(self, every: int) -> list[date]:
+        ret: list[date] = []
+        year, month = self.start.year, self.start.month
+        if self.start.day > 1:
+            month += 1
+        while True:
+            if month > 12:
+                year, month = year + 1, month - 12
+            day = date(year, month, 1)
+            if (day - self.start).days > self.days:
+                return ret
+            if (month - 1) % every == 0:
+                ret.append(day)
+            month += 1
+
+
+def _get_tick_step(max_value: float, count: int = 10) -> float:
+    step = max_value / count
+    power = math.floor(math.log10(step))
+    error = step / 10**power
+    if error >= math.sqrt(50):
+        factor = 10
+    elif error >= math.sqrt(10):
+        factor = 5
+    elif error >= math.sqrt(2):
+        factor = 2
+    else:
+        factor = 1
+    return factor * 10**power
+
+
+def _round_tick(value: float) -> T.Union[int, float]:
+    return int(value) if value == int(value) else round(value, 10)
+
+
+def _format_number(value: T.Union[int, float]) -> str:
+    return f"{value:,}"
+
+
+def _format_month(day: date) -> str:
+    return str(day.year) if day.month == 1 else day.strftime("%B")
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.1f}".rstrip("0").rstrip(".")
+
+
+def _render_path(
+    points: list[tuple[float, float]], baseline: T.Optional[float] = None
+) -> str:
+    path = "M" + "L".join(f"{_fmt(x)},{_fmt(y)}" for x, y in points)
+    if baseline is not None:
+        path += (
+            f"L{_fmt(points[-1][0])},{_fmt(baseline)}"
+            f"L{_fmt(points[0][0])},{_fmt(baseline)}Z"
+        )
+    return path
+
+
+def _render_grid(
+    x: _TimeScale, y1: _LinearScale, y2: _LinearScale
+) -> T.Iterator[str]:
+    yield "<g class='grid'>"
+    for day in x.month_ticks(1):
+        yield (
+            f"<line x1='{_fmt(x(day))}' x2='{_fmt(x(day))}' "
+            f"y1='0' y2='{CHART_INNER_HEIGHT}' stroke='currentColor'/>"
+        )
+    for scale in (y1, y2):
+        for value in scale.ticks():
+            yield (
+                f"<line x1='0' x2='{CHART_INNER_WIDTH}' "
+                f"y1='{_fmt(scale(value))}' y2='{_fmt(scale(value))}' "
+                "stroke='currentColor'/>"
+            )
+    yield "</g>"
+
+
+def _render_axes(
+    x: _TimeScale, y1: _LinearScale, y2: _LinearScale
+) -> T.Iterator[str]:
+    text_offset = TICK_SIZE + TICK_PADDING
+
+    yield (
+        f"<g transform='translate(0,{CHART_INNER_HEIGHT})' "
+        f"{AXIS_ATTRS} text-anchor='middle'>"
+    )
+    yield (
+        f"<path stroke='currentColor' "
+        f"d='M0,{TICK_SIZE}V0H{CHART_INNER_WIDTH}V{TICK_SIZE}'/>"
+    )
+    for day in x.month_ticks(3):
+        yield (
+            f"<g transform='translate({_fmt(x(day))},0)'>"
+            f"<line stroke='currentColor' y2='{TICK_SIZE}'/>"
+            f"<text fill='currentColor' y='{text_offset}' dy='0.71em'>"
+            f"{_format_month(day)}</text></g>"
+        )
+    yield "</g>"
+
+    for scale, translate, sign, anchor in (
+        (y1, 0, -1, "end"),
+        (y2, CHART_INNER_WIDTH, 1, "start"),
+    ):
+        yield (
+            f"<g transform='translate({translate},0)' "
+            f"{AXIS_ATTRS} text-anchor='{anchor}'>"
+        )
+        yield (
+            f"<path stroke='currentColor' d='M{sign * TICK_SIZE},"
+            f"{CHART_INNER_HEIGHT}H0V0H{sign * TICK_SIZE}'/>"
+        )
+        for value in scale.ticks():
+            yield (
+                f"<g transform='translate(0,{_fmt(scale(value))})'>"
+                f"<line stroke='currentColor' x2='{sign * TICK_SIZE}'/>"
+                f"<text fill='currentColor' x='{sign * text_offset}' "
+                f"dy='0.32em'>{_format_number(value)}</text></g>"
+            )
+        yield "</g>"
+
+
+def _render_legend(series: list[ChartSeries]) -> T.Iterator[str]:
+    height = (
+        2 * LEGEND_PADDING
+        + LEGEND_SQUARE_SIZE * len(series)
+        + LEGEND_SQUARE_SPACING * (len(series) - 1)
+    )
+    yield (
+        f"<rect x='{LEGEND_X}' y='{LEGEND_Y}' width='{LEGEND_WIDTH}' "
+        f"height='{height}' class='legend-wrapper'/>"
+    )
+    for idx, item in enumerate(series):
+        y = (
+            LEGEND_Y
+            + LEGEND_PADDING
+            + idx * (LEGEND_SQUARE_SIZE + LEGEND_SQUARE_SPACING)
+        )
+        yield (
+            f"<rect x='{LEGEND_X + LEGEND_PADDING}' y='{y}' "
+            f"width='{LEGEND_SQUARE_SIZE}' height='{LEGEND_SQUARE_SIZE}' "
+            f"class='legend {item.class_name}'/>"
+        )
+        text_x = (
+            LEGEND_X
+            + LEGEND_PADDING
+            + LEGEND_SQUARE_SIZE
+            + LEGEND_TEXT_SPACING
+        )
+        yield (
+            f"<text x='{text_x}' y='{_fmt(y + LEGEND_SQUARE_SIZE / 2)}' "
+            f"class='legend {item.class_name}'>{escape(item.title)}</text>"
+        )
+
+
+def _render_hover_data(
+    series: list[ChartSeries], start: date, x: _TimeScale
+) -> str:
+    data = {
+        "start": start.isoformat(),
+        "days": x.days,
+        "left": CHART_MARGIN_LEFT,
+        "width": CHART_INNER_WIDTH,
+        "series": [
+            {
+                "title": item.title,
+                "className": item.class_name,
+                "values": {
+                    day.isoformat(): value
+                    for day, value in item.values.items()
+                },
+            }
+            for item in series
+        ],
+    }
+    return (
+        "<script type='application/json' class='data'>"
+        + json.dumps(data, separators=(",", ":")).replace("</", "<\\/")
+        + "</script>"
+    )
+
+
+def render_chart(series: list[ChartSeries]) -> Markup:
+    days = [day for item in series for day in item.values]
+    if not days:
+        return Markup("")
+
+    start, end = min(days), max(days)
+    x = _TimeScale(start, end, CHART_INNER_WIDTH)
+    y1 = _LinearScale(
+        max(value for item in series for value in item.values.values()),
+        CHART_INNER_HEIGHT,
+    )
+    y2 = _LinearScale(
+        max(
+            (
+                value
+                for item in series
+                if item.secondary
+                for value in item.values.values()
+            ),
+            default=0,
+        ),
+        CHART_INNER_HEIGHT,
+    )
+
+    parts = [
+        f"<svg viewBox='0 0 {CHART_WIDTH} {CHART_HEIGHT}' "
+        "xmlns='http://www.w3.org/2000/svg'>",
+        f"<g transform='translate({CHART_MARGIN_LEFT},{CHART_MARGIN_TOP})'>",
+        *_render_grid(x, y1, y2),
+    ]
+    for item in series:
+        if not item.values:
+            continue
+        scale = y2 if item.secondary else y1
+        points = [
+            (x(day), scale(value))
+            for day, value in sorted(item.values.items())
+        ]
+        parts.append(
+            f"<path class='area {item.class_name}' "
+            f"d='{_render_path(points, baseline=CHART_INNER_HEIGHT)}'/>"
+        )
+        parts.append(
+            f"<path class='line {item.class_name}' "
+            f"d='{_render_path(points)}'/>"
+        )
+    parts.extend(_render_legend(series))
+    parts.extend(_render_axes(x, y1, y2))
+    parts.append(
+        f"<line class='hover-guide' y1='0' y2='{CHART_INNER_HEIGHT}' "
+        "visibility='hidden'/>"
+    )
+    parts.append("</g></svg>")
+    parts.append(_render_hover_data(series, start, x))
+    return Markup("".join(parts))
+
+
+def render_daily_stats_chart(
+    traffic_stats: T.Iterable[T.Any],
+    anidex_stats: dict[date, int],
+    nyaa_si_stats: dict[date, int],
+) -> Markup:
+    return render_chart(
+        [
+            ChartSeries(
+                title="Website views",
+                class_name="page-views",
+                values={stat.day: stat.requests for stat in traffic_stats},
+                secondary=False,
+            ),
+            ChartSeries(
+                title="Anidex downloads",
+                class_name="anidex-downloads",
+                values=anidex_stats,
+                secondary=True,
+            ),
+            ChartSeries(
+                title="Nyaa.si downloads",
+                class_name="nyaa-si-downloads",
+                values=nyaa_si_stats,
+                secondary=True,
+            ),
+        ]
+    )
@@ -1,18 +1,28 @@
 import dataclasses
+import functools
+import itertools
+import os
 import typing as T
 from datetime import date, datetime, timedelta
 from pathlib import Path
 
 PROJ_DIR = Path(__file__).parent
 ROOT_DIR = PROJ_DIR.parent
-DATA_DIR = ROOT_DIR / "data"
+DATA_DIR = Path(os.environ.get("OC_STATS_DATA_DIR", ROOT_DIR / "data"))
 CACHE_DIR = DATA_DIR / "cache"
 STATIC_DIR = PROJ_DIR / "static"
 
 
+@functools.cache
+def get_field_names(cls: type) -> tuple[str, ...]:
+    return tuple(field.name for field in dataclasses.fields(cls))
+
+
 def json_default(obj: T.Any) -> T.Any:
     if dataclasses.is_dataclass(obj):
-        return dataclasses.asdict(obj)
+        return {
+            name: getattr(obj, name) for name in get_field_names(type(obj))
+        }
     if isinstance(obj, (datetime, date)):
         return obj.isoformat()
     if isinstance(obj, timedelta):
@@ -35,3 +45,23 @@ def convert_to_diffs(
         prev_key = key
         prev_value = value
     return ret
+
+
+def combine_diffs(
+    items: dict[str, dict[date, T.Union[int, float]]]
+) -> dict[date, T.Union[int, float]]:
+    ret: dict[date, T.Union[int, float]] = {}
+    for account_items in items.values():
+        for key, value in convert_to_diffs(account_items).items():
+            ret[key] = ret.get(key, 0) + value
+    return dict(sorted(ret.items()))
+
+
+def delta_encode(values: list[int]) -> list[int]:
+    return [
+        value - prev_value for prev_value, value in zip([0] + values, values)
+    ]
+
+
+def delta_decode(values: list[int]) -> list[int]:
+    return list(itertools.accumulate(values))
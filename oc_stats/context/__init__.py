@@ -6,6 +6,7 @@ from oc_stats.context.daily_nyaa_si_stats import DailyNyaaSiStatsContextBuilder
 from oc_stats.context.daily_traffic_stats import (
     DailyTrafficStatsContextBuilder,
 )
+from oc_stats.context.torrent_history import TorrentHistoryContextBuilder
 from oc_stats.context.torrents import TorrentsContextBuilder
 from oc_stats.context.transmission_stats import TransmissionStatsContextBuilder
 
@@ -16,6 +17,7 @@ __all__ = [
     "DailyAnidexStatsContextBuilder",
     "DailyNyaaSiStatsContextBuilder",
     "DailyTrafficStatsContextBuilder",
+    "TorrentHistoryContextBuilder",
     "TorrentsContextBuilder",
     "TransmissionStatsContextBuilder",
 ]
@@ -1,18 +1,29 @@
+import heapq
 import json
+import logging
 import typing as T
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta, timezone
 
-import dateutil.parser
 from flask import url_for
 
-from oc_stats.api.anidb import get_anidb_info
-from oc_stats.api.dedibox import get_anime_requests
 from oc_stats.common import CACHE_DIR, STATIC_DIR
 from oc_stats.context.base import BaseContextBuilder
+from oc_stats.deadline import DeadlineExceeded, check_deadline
+from oc_stats.search import SearchIndex
+from oc_stats.thumbnails import (
+    get_thumbnail_name,
+    link_thumbnails_dir,
+    update_thumbnails,
+)
 
+ANIDB_REFRESH_AGE = timedelta(days=90)
+ANIDB_REFRESH_BUDGET = 5
+ANIDB_RETRY_AGE = timedelta(days=1)
+ANIDB_IMAGES_DIR = STATIC_DIR / "anidb"
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class AnimeRequestDTO:
     date: T.Optional[datetime]
     title: str
@@ -23,6 +34,13 @@ class AnimeRequestDTO:
     type: T.Optional[str]
     episodes: T.Optional[int]
     year: T.Optional[int]
+    thumbnail: T.Optional[str] = None
+    anidb_updated: T.Optional[datetime] = None
+    anidb_failed: T.Optional[datetime] = None
+
+    @property
+    def search_id(self) -> str:
+        return f"{self.link}@{self.date.isoformat() if self.date else ''}"
 
     @property
     def picture(self) -> T.Optional[str]:
@@ -32,9 +50,86 @@ class AnimeRequestDTO:
             else None
         )
 
+    def thumbnail_url(self, size: str, ext: str) -> T.Optional[str]:
+        if not self.thumbnail:
+            return None
+        return url_for(
+            "static",
+            filename="thumbnails/"
+            + get_thumbnail_name(self.thumbnail, size, ext),
+        )
+
+
+def _make_request(
+    date: T.Optional[datetime],
+    title: str,
+    link: str,
+    anidb_id: T.Optional[int],
+    comment: T.Optional[str],
+    previous: T.Optional[AnimeRequestDTO] = None,
+) -> AnimeRequestDTO:
+    from oc_stats.api.anidb import get_anidb_info
+
+    anidb_info = (
+        get_anidb_info(anidb_id, max_age=ANIDB_REFRESH_AGE)
+        if anidb_id
+        else None
+    )
+    if anidb_id and not anidb_info:
+        failed = datetime.now(timezone.utc)
+        if previous:
+            return replace(previous, anidb_failed=failed)
+        return AnimeRequestDTO(
+            date=date,
+            title=title,
+            link=link,
+            anidb_id=anidb_id,
+            comment=comment,
+            synopsis=None,
+            type=None,
+            episodes=None,
+            year=None,
+            anidb_failed=failed,
+        )
+    return AnimeRequestDTO(
+        date=date,
+        title=anidb_info.title if anidb_info else title,
+        link=link,
+        anidb_id=anidb_id,
+        comment=comment,
+        synopsis=anidb_info.synopsis if anidb_info else None,
+        type=anidb_info.type if anidb_info else None,
+        episodes=anidb_info.episodes if anidb_info else None,
+        year=anidb_info.start_date.year
+        if anidb_info and anidb_info.start_date
+        else None,
+        anidb_updated=anidb_info.fetched if anidb_info else None,
+    )
+
+
+def _is_stale(request: AnimeRequestDTO, now: datetime) -> bool:
+    if not request.anidb_id:
+        return False
+    if request.anidb_failed and now - request.anidb_failed < ANIDB_RETRY_AGE:
+        return False
+    if request.anidb_updated is None:
+        return True
+    if now - request.anidb_updated > ANIDB_REFRESH_AGE:
+        return True
+    return bool(
+        request.synopsis
+        and not (ANIDB_IMAGES_DIR / f"{request.anidb_id}.jpg").exists()
+    )
+
+
+def _sort_key(request: AnimeRequestDTO) -> datetime:
+    return request.date.replace(tzinfo=None) if request.date else datetime.min
+
 
 class AnimeRequestsContextBuilder(BaseContextBuilder):
     context_key = "anime_requests"
+    update_budget = 300
+    update_grace_period = 120
 
     @staticmethod
     def deserialize(value: T.Optional[str]) -> T.Any:
@@ -43,54 +138,105 @@ class AnimeRequestsContextBuilder(BaseContextBuilder):
         return [
             AnimeRequestDTO(
                 date=(
-                    dateutil.parser.parse(item_date)
+                    datetime.fromisoformat(item_date)
                     if (item_date := item.pop("date"))
                     else None
                 ),
+                anidb_updated=(
+                    datetime.fromisoformat(anidb_updated)
+                    if (anidb_updated := item.pop("anidb_updated", None))
+                    else None
+                ),
+                anidb_failed=(
+                    datetime.fromisoformat(anidb_failed)
+                    if (anidb_failed := item.pop("anidb_failed", None))
+                    else None
+                ),
                 **item,
             )
             for item in json.loads(value)
         ]
 
+    @staticmethod
+    def update_search_index(index: SearchIndex, value: T.Any) -> None:
+        index.sync_anime_requests(value)
+
     def update(self, original_value: T.Any) -> T.Any:
-        requests = list(get_anime_requests())
-
-        ret = []
-        for request in requests:
-            if request.anidb_id:
-                anidb_info = get_anidb_info(request.anidb_id)
-            else:
-                anidb_info = None
-
-            ret.append(
-                AnimeRequestDTO(
-                    date=request.date,
-                    title=anidb_info.title if anidb_info else request.title,
-                    link=request.link,
-                    anidb_id=request.anidb_id,
-                    comment=request.comment,
-                    synopsis=anidb_info.synopsis if anidb_info else None,
-                    type=anidb_info.type if anidb_info else None,
-                    episodes=anidb_info.episodes if anidb_info else None,
-                    year=anidb_info.start_date.year
-                    if anidb_info and anidb_info.start_date
-                    else None,
-                )
+        from oc_stats.api.anidb import collect_anidb_cache_garbage
+        from oc_stats.api.dedibox import get_anime_requests
+
+        stored_keys = {
+            (request.link, request.date) for request in original_value
+        }
+        incoming = list(get_anime_requests())
+        incoming_keys = {(request.link, request.date) for request in incoming}
+        ret = [
+            request
+            for request in original_value
+            if (request.link, request.date) in incoming_keys
+        ]
+
+        new: list[AnimeRequestDTO] = []
+        try:
+            for request in incoming:
+                if (request.link, request.date) not in stored_keys:
+                    check_deadline()
+                    new.append(
+                        _make_request(
+                            date=request.date,
+                            title=request.title,
+                            link=request.link,
+                            anidb_id=request.anidb_id,
+                            comment=request.comment,
+                        )
+                    )
+
+            refresh_budget = ANIDB_REFRESH_BUDGET
+            now = datetime.now(timezone.utc)
+            for idx, request in enumerate(ret):
+                if not refresh_budget:
+                    break
+                if _is_stale(request, now):
+                    check_deadline()
+                    ret[idx] = _make_request(
+                        date=request.date,
+                        title=request.title,
+                        link=request.link,
+                        anidb_id=request.anidb_id,
+                        comment=request.comment,
+                        previous=request,
+                    )
+                    refresh_budget -= 1
+        except DeadlineExceeded:
+            logging.warning(
+                "anime requests: time budget exhausted, "
+                "keeping partial progress"
             )
 
-        images_dir = STATIC_DIR / "anidb"
-        if not images_dir.exists():
-            images_dir.symlink_to(
+        new.sort(key=_sort_key, reverse=True)
+        ret = list(heapq.merge(ret, new, key=_sort_key, reverse=True))
+
+        collect_anidb_cache_garbage(
+            request.anidb_id for request in ret if request.anidb_id
+        )
+
+        if not ANIDB_IMAGES_DIR.exists():
+            ANIDB_IMAGES_DIR.symlink_to(
                 CACHE_DIR / "anidb", target_is_directory=True
             )
 
-        ret.sort(
-            key=(
-                lambda request: request.date.replace(tzinfo=None)
-                if request.date
-                else datetime.min
-            ),
-            reverse=True,
+        thumbnails = update_thumbnails(
+            {
+                request.anidb_id: ANIDB_IMAGES_DIR / f"{request.anidb_id}.jpg"
+                for request in ret
+                if request.anidb_id and request.synopsis
+            }
         )
+        ret = [
+            replace(request, thumbnail=thumbnails.get(request.anidb_id))
+            for request in ret
+        ]
+
+        link_thumbnails_dir()
 
         return ret
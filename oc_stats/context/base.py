@@ -3,10 +3,13 @@ import typing as T
 from pathlib import Path
 
 from oc_stats.common import DATA_DIR, json_default
+from oc_stats.search import SearchIndex
 
 
 class BaseContextBuilder:
     context_key: str = NotImplemented
+    update_budget: float = 120
+    update_grace_period: float = 5
 
     @property
     def db_path(self) -> Path:
@@ -26,3 +29,7 @@ class BaseContextBuilder:
 
     def update(self, original_value: T.Any) -> T.Any:
         raise NotImplementedError("not implemented")
+
+    @staticmethod
+    def update_search_index(index: SearchIndex, value: T.Any) -> None:
+        pass
@@ -1,16 +1,31 @@
+import heapq
 import json
+import logging
+import re
 import typing as T
-from dataclasses import dataclass
-from datetime import datetime
+from dataclasses import dataclass, replace
+from datetime import datetime, timedelta
+from pathlib import Path
 
-import dateutil.parser
+from flask import url_for
 
-from oc_stats.api import nyaa_si
-from oc_stats.api.dedibox import get_guestbook_comments
+from oc_stats.accounts import get_nyaa_si_accounts
 from oc_stats.context.base import BaseContextBuilder
+from oc_stats.deadline import DeadlineExceeded, check_deadline
+from oc_stats.search import SearchIndex
+from oc_stats.thumbnails import (
+    AVATAR_SIZES,
+    AVATARS_INDEX_PATH,
+    get_thumbnail_name,
+    link_thumbnails_dir,
+    update_thumbnails,
+)
 
+COMMENTS_REFRESH_AGE = timedelta(days=7)
+COMMENTS_REFRESH_BUDGET = 20
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class CommentDTO:
     source: str
     website_title: T.Optional[str]
@@ -19,29 +34,122 @@ class CommentDTO:
     author_name: str
     author_avatar_url: T.Optional[str]
     text: str
+    comment_id: str
+    avatar: T.Optional[str] = None
+
+    @property
+    def thread_id(self) -> str:
+        return self.comment_id.rsplit(":", 1)[0]
+
+    def avatar_url(self, ext: str) -> T.Optional[str]:
+        if not self.avatar:
+            return None
+        return url_for(
+            "static",
+            filename="thumbnails/"
+            + get_thumbnail_name(self.avatar, "avatar", ext),
+        )
+
+
+def _make_legacy_comment_id(
+    source: str, website_link: T.Optional[str]
+) -> T.Optional[str]:
+    if source == "guestbook":
+        match = re.search(r"#comment-(\w+)", website_link or "")
+        return f"guestbook:{match.group(1)}" if match else None
+    match = re.search(r"/view/(\d+)#com-(\d+)", website_link or "")
+    return f"{source}:{match.group(1)}:{match.group(2)}" if match else None
+
+
+def _sort_key(comment: CommentDTO) -> datetime:
+    return comment.comment_date
+
+
+def _is_changed(stored: dict[str, CommentDTO], comment: CommentDTO) -> bool:
+    previous = stored.get(comment.comment_id)
+    return previous is None or replace(previous, avatar=None) != comment
+
+
+def _update_avatars(comments: list[CommentDTO]) -> list[CommentDTO]:
+    from oc_stats.api.avatars import collect_avatar_cache_garbage, get_avatar
+
+    urls = {
+        comment.author_avatar_url
+        for comment in comments
+        if comment.author_avatar_url
+    }
+    sources: dict[str, Path] = {}
+    try:
+        for url in urls:
+            check_deadline()
+            if path := get_avatar(url):
+                sources[url] = path
+    except DeadlineExceeded:
+        logging.warning(
+            "comments: time budget exhausted, keeping partial avatars"
+        )
+    collect_avatar_cache_garbage(urls)
+
+    avatars = update_thumbnails(
+        sources, sizes=AVATAR_SIZES, index_path=AVATARS_INDEX_PATH
+    )
+    link_thumbnails_dir()
+
+    if all(
+        comment.avatar == avatars.get(comment.author_avatar_url)
+        for comment in comments
+    ):
+        return comments
+    return [
+        replace(comment, avatar=avatars.get(comment.author_avatar_url))
+        for comment in comments
+    ]
 
 
 class CommentsContextBuilder(BaseContextBuilder):
     context_key = "comments"
+    update_budget = 300
+    update_grace_period = 120
 
     @staticmethod
     def deserialize(value: T.Optional[str]) -> T.Any:
         if not value:
             return []
-        return [
-            CommentDTO(
-                comment_date=dateutil.parser.parse(item.pop("comment_date")),
-                **item,
+        ret: list[CommentDTO] = []
+        for item in json.loads(value):
+            comment_id = item.pop("comment_id", None) or (
+                _make_legacy_comment_id(item["source"], item["website_link"])
             )
-            for item in json.loads(value)
-        ]
+            if not comment_id:
+                logging.warning(
+                    "comments: skipping stored comment without an id: "
+                    f"{item['source']} {item['website_link']}"
+                )
+                continue
+            ret.append(
+                CommentDTO(
+                    comment_date=datetime.fromisoformat(
+                        item.pop("comment_date")
+                    ),
+                    comment_id=comment_id,
+                    **item,
+                )
+            )
+        return ret
+
+    @staticmethod
+    def update_search_index(index: SearchIndex, value: T.Any) -> None:
+        index.sync_comments(value)
 
     def update(self, original_value: T.Any) -> T.Any:
-        ret: list[CommentDTO] = []
+        from oc_stats.api import nyaa_si
+        from oc_stats.api.dedibox import get_guestbook_comments
 
-        guestbook_comments = get_guestbook_comments()
-        ret.extend(
-            CommentDTO(
+        stored = {comment.comment_id: comment for comment in original_value}
+        changed: list[CommentDTO] = []
+
+        for comment in get_guestbook_comments():
+            dto = CommentDTO(
                 source="guestbook",
                 website_title=None,
                 website_link=comment.website_link,
@@ -49,34 +157,81 @@ class CommentsContextBuilder(BaseContextBuilder):
                 author_name=comment.author_name,
                 author_avatar_url=comment.author_avatar_url,
                 text=comment.text,
+                comment_id=f"guestbook:{comment.comment_id}",
             )
-            for comment in guestbook_comments
-        )
+            if _is_changed(stored, dto):
+                changed.append(dto)
 
-        nyaa_si_torrents = list(nyaa_si.get_user_torrents())
-        nyaa_si_comments = list(
-            sum(
-                (
-                    list(nyaa_si.get_torrent_comments(torrent))
-                    for torrent in nyaa_si_torrents
-                ),
-                [],
+        user_torrents = nyaa_si.get_all_user_torrents()
+        torrents = [
+            torrent
+            for account_torrents in user_torrents.values()
+            for torrent in account_torrents
+        ]
+        refresh_age = COMMENTS_REFRESH_AGE.total_seconds()
+        refresh_budget = COMMENTS_REFRESH_BUDGET
+        try:
+            for torrent in torrents:
+                if not torrent.comment_count:
+                    continue
+                thread_id = f"nyaa.si:{torrent.torrent_id}"
+                # the cached page is keyed by the listed comment count, so
+                # it is missing when comments were added or deleted; edits
+                # are picked up by re-fetching pages once they get old
+                age = nyaa_si.get_torrent_comments_age(torrent)
+                if age is not None and age <= refresh_age:
+                    continue
+                if age is not None:
+                    if not refresh_budget:
+                        continue
+                    refresh_budget -= 1
+                check_deadline()
+                for comment in nyaa_si.get_torrent_comments(
+                    torrent, max_age=refresh_age
+                ):
+                    dto = CommentDTO(
+                        source="nyaa.si",
+                        website_title=comment.website_title,
+                        website_link=comment.website_link,
+                        comment_date=comment.comment_date,
+                        author_name=comment.author_name,
+                        author_avatar_url=comment.author_avatar_url,
+                        text=comment.text,
+                        comment_id=f"{thread_id}:{comment.comment_id}",
+                    )
+                    if _is_changed(stored, dto):
+                        changed.append(dto)
+        except DeadlineExceeded:
+            logging.warning(
+                "comments: time budget exhausted, keeping partial progress"
             )
-        )
 
-        ret.extend(
-            CommentDTO(
-                source="nyaa.si",
-                website_title=comment.website_title,
-                website_link=comment.website_link,
-                comment_date=comment.comment_date,
-                author_name=comment.author_name,
-                author_avatar_url=comment.author_avatar_url,
-                text=comment.text,
+        # a failed account leaves its torrents out of the listing, and their
+        # cached comment pages must not be collected because of that
+        if len(user_torrents) == len(get_nyaa_si_accounts()):
+            nyaa_si.collect_torrent_cache_garbage(torrents)
+        else:
+            logging.warning(
+                "comments: some nyaa.si accounts failed, "
+                "skipping torrent cache cleanup"
             )
-            for comment in nyaa_si_comments
-        )
 
-        ret.sort(key=lambda comment: comment.comment_date, reverse=True)
+        if not changed:
+            return _update_avatars(original_value)
 
-        return ret
+        changed_ids = {comment.comment_id for comment in changed}
+        changed.sort(key=_sort_key, reverse=True)
+        return _update_avatars(
+            list(
+                heapq.merge(
+                    (
+                        comment
+                        for comment in original_value
+                        if comment.comment_id not in changed_ids
+                    ),
+                    changed,
+                    key=_sort_key,
+                    reverse=True,
+                )
+            )
+        )
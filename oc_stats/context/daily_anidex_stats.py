@@ -2,10 +2,8 @@ import json
 import typing as T
 from datetime import date
 
-import dateutil.parser
-
-from oc_stats.api.anidex import get_group_torrents
-from oc_stats.common import convert_to_diffs, json_default
+from oc_stats.accounts import get_legacy_account_name
+from oc_stats.common import combine_diffs, json_default
 from oc_stats.context.base import BaseContextBuilder
 
 
@@ -16,29 +14,39 @@ class DailyAnidexStatsContextBuilder(BaseContextBuilder):
     def deserialize(value: T.Optional[str]) -> T.Any:
         if not value:
             return {}
+        data = json.loads(value)
+        if data and not isinstance(next(iter(data.values())), dict):
+            # data written before accounts were tracked separately
+            data = {get_legacy_account_name("anidex"): data}
         return {
-            dateutil.parser.parse(key).date(): value
-            for key, value in json.loads(value).items()
+            account: {
+                date.fromisoformat(key): value for key, value in items.items()
+            }
+            for account, items in data.items()
         }
 
     @staticmethod
     def serialize(value: T.Any) -> str:
         return json.dumps(
-            {key.isoformat(): value for key, value in value.items()},
+            {
+                account: {
+                    key.isoformat(): value for key, value in items.items()
+                }
+                for account, items in value.items()
+            },
             default=json_default,
             indent=4,
         )
 
     @staticmethod
     def transform_context(value: T.Any) -> T.Any:
-        return {
-            key.isoformat(): value
-            for key, value in convert_to_diffs(value).items()
-        }
+        return combine_diffs(value)
 
     def update(self, original_value: T.Any) -> T.Any:
-        torrents = list(get_group_torrents())
-        original_value[date.today()] = sum(
-            torrent.download_count for torrent in torrents
-        )
+        from oc_stats.api.anidex import get_all_group_torrents
+
+        for account, torrents in get_all_group_torrents().items():
+            original_value.setdefault(account.name, {})[date.today()] = sum(
+                torrent.download_count for torrent in torrents
+            )
         return original_value
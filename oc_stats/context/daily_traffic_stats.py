@@ -1,15 +1,14 @@
 import json
 import typing as T
 from dataclasses import dataclass
-from datetime import date
+from datetime import date, timedelta
 
-import dateutil.parser
-
-from oc_stats.api.cloudflare import get_recent_hits
+from oc_stats.accounts import CloudflareZone, get_legacy_account_name
 from oc_stats.context.base import BaseContextBuilder
+from oc_stats.shards import map_shards
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class DailyTrafficStatDTO:
     day: date
     requests: int
@@ -17,28 +16,103 @@ class DailyTrafficStatDTO:
     unique_visitors: int
 
 
+def _sort_key(stat: DailyTrafficStatDTO) -> date:
+    return stat.day
+
+
+def _combine_stats(
+    stats: T.Iterable[DailyTrafficStatDTO],
+) -> list[DailyTrafficStatDTO]:
+    ret: dict[date, DailyTrafficStatDTO] = {}
+    for stat in stats:
+        if previous := ret.get(stat.day):
+            stat = DailyTrafficStatDTO(
+                day=stat.day,
+                requests=previous.requests + stat.requests,
+                page_views=previous.page_views + stat.page_views,
+                unique_visitors=previous.unique_visitors
+                + stat.unique_visitors,
+            )
+        ret[stat.day] = stat
+    return sorted(ret.values(), key=_sort_key)
+
+
 class DailyTrafficStatsContextBuilder(BaseContextBuilder):
     context_key = "daily_traffic_stats"
+    initial_days = 10
+    settle_days = 3
+    backfill_since: T.Optional[date] = None
 
     @staticmethod
     def deserialize(value: T.Optional[str]) -> T.Any:
         if not value:
-            return []
-        return [
-            DailyTrafficStatDTO(
-                day=dateutil.parser.parse(item.pop("day")).date(),
-                **item,
+            return {}
+        data = json.loads(value)
+        if isinstance(data, list):
+            # data written before zones were tracked separately
+            data = {get_legacy_account_name("cloudflare"): data}
+        return {
+            zone: sorted(
+                (
+                    DailyTrafficStatDTO(
+                        day=date.fromisoformat(item.pop("day")),
+                        **item,
+                    )
+                    for item in items
+                ),
+                key=_sort_key,
             )
-            for item in json.loads(value)
-        ]
+            for zone, items in data.items()
+        }
+
+    @staticmethod
+    def transform_context(value: T.Any) -> T.Any:
+        if len(value) == 1:
+            return next(iter(value.values()))
+        return _combine_stats(
+            stat for zone_stats in value.values() for stat in zone_stats
+        )
 
     def update(self, original_value: T.Any) -> T.Any:
-        mapping = {stat.day: stat for stat in original_value}
-        for day, stat in get_recent_hits().items():
-            mapping[day] = DailyTrafficStatDTO(
+        from oc_stats.accounts import get_cloudflare_zones
+
+        for zone, stats in map_shards(
+            lambda zone: self._update_zone(
+                zone, original_value.get(zone.name, [])
+            ),
+            get_cloudflare_zones(),
+        ).items():
+            original_value[zone.name] = stats
+        return original_value
+
+    def _update_zone(
+        self, zone: CloudflareZone, original_value: T.Any
+    ) -> T.Any:
+        from oc_stats.api.cloudflare import iter_hits
+
+        today = date.today()
+        if self.backfill_since:
+            start = self.backfill_since
+        elif original_value:
+            start = original_value[-1].day - timedelta(days=self.settle_days)
+        else:
+            start = today - timedelta(days=self.initial_days)
+
+        fetched = [
+            DailyTrafficStatDTO(
                 day=day,
                 requests=stat.requests,
                 page_views=stat.page_views,
                 unique_visitors=stat.unique_visitors,
             )
-        return list(mapping.values())
+            for day, stat in iter_hits(zone, start, today)
+        ]
+
+        mapping: dict[date, DailyTrafficStatDTO] = {}
+        while original_value and original_value[-1].day >= start:
+            stat = original_value.pop()
+            mapping[stat.day] = stat
+        mapping.update((stat.day, stat) for stat in fetched)
+
+        original_value.extend(sorted(mapping.values(), key=_sort_key))
+        return original_value
@@ -0,0 +1,173 @@
+import heapq
+import itertools
+import json
+import logging
+import typing as T
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass, field
+from datetime import date
+
+from oc_stats.common import delta_decode, delta_encode
+from oc_stats.context.base import BaseContextBuilder
+
+COUNTERS = (
+    "seeder_counts",
+    "leecher_counts",
+    "download_counts",
+    "comment_counts",
+)
+
+
+@dataclass(slots=True)
+class TorrentHistoryDTO:
+    source: str
+    torrent_id: int
+    name: str
+    last_seen: date
+    days: list[int] = field(default_factory=list)
+    seeder_counts: list[int] = field(default_factory=list)
+    leecher_counts: list[int] = field(default_factory=list)
+    download_counts: list[int] = field(default_factory=list)
+    comment_counts: list[int] = field(default_factory=list)
+
+    @property
+    def key(self) -> tuple[str, int]:
+        return (self.source, self.torrent_id)
+
+    def record(
+        self,
+        day: date,
+        seeder_count: int,
+        leecher_count: int,
+        download_count: int,
+        comment_count: int,
+    ) -> None:
+        self.last_seen = day
+        row = (seeder_count, leecher_count, download_count, comment_count)
+        if self.days and self._row(-1) == row:
+            return
+        if self.days and self.days[-1] == day.toordinal():
+            for counter, value in zip(COUNTERS, row):
+                getattr(self, counter)[-1] = value
+            return
+        self.days.append(day.toordinal())
+        for counter, value in zip(COUNTERS, row):
+            getattr(self, counter).append(value)
+
+    def download_count_at(self, day: date) -> T.Optional[int]:
+        idx = bisect_right(self.days, day.toordinal())
+        if not idx:
+            return None
+        return self.download_counts[idx - 1]
+
+    def downloads_between(self, start: date, end: date) -> int:
+        end_value = self.download_count_at(end)
+        if end_value is None:
+            return 0
+        start_value = self.download_count_at(start)
+        if start_value is None:
+            idx = bisect_left(self.days, start.toordinal())
+            start_value = self.download_counts[idx]
+        return end_value - start_value
+
+    def _row(self, idx: int) -> tuple[int, ...]:
+        return tuple(getattr(self, counter)[idx] for counter in COUNTERS)
+
+
+TorrentHistory = dict[tuple[str, int], TorrentHistoryDTO]
+
+
+def get_top_torrents(
+    history: TorrentHistory, start: date, end: date, limit: int = 10
+) -> list[tuple[TorrentHistoryDTO, int]]:
+    return heapq.nlargest(
+        limit,
+        (
+            (item, item.downloads_between(start, end))
+            for item in history.values()
+            if item.days
+            and item.days[0] <= end.toordinal()
+            and item.last_seen >= start
+        ),
+        key=lambda pair: pair[1],
+    )
+
+
+class TorrentHistoryContextBuilder(BaseContextBuilder):
+    context_key = "torrent_history"
+
+    @staticmethod
+    def deserialize(value: T.Optional[str]) -> T.Any:
+        if not value:
+            return {}
+        ret: TorrentHistory = {}
+        for item in json.loads(value):
+            dto = TorrentHistoryDTO(
+                source=item["source"],
+                torrent_id=item["torrent_id"],
+                name=item["name"],
+                last_seen=date.fromordinal(item["last_seen"]),
+                days=delta_decode(item["days"]),
+                **{
+                    counter: delta_decode(item[counter])
+                    for counter in COUNTERS
+                },
+            )
+            ret[dto.key] = dto
+        return ret
+
+    @staticmethod
+    def serialize(value: T.Any) -> str:
+        return json.dumps(
+            [
+                {
+                    "source": item.source,
+                    "torrent_id": item.torrent_id,
+                    "name": item.name,
+                    "last_seen": item.last_seen.toordinal(),
+                    "days": delta_encode(item.days),
+                    **{
+                        counter: delta_encode(getattr(item, counter))
+                        for counter in COUNTERS
+                    },
+                }
+                for item in value.values()
+            ],
+            separators=(",", ":"),
+        )
+
+    def update(self, original_value: T.Any) -> T.Any:
+        from oc_stats.api import anidex, nyaa_si
+
+        today = date.today()
+
+        for source, get_all_torrents in [
+            ("nyaa.si", nyaa_si.get_all_user_torrents),
+            ("anidex.info", anidex.get_all_group_torrents),
+        ]:
+            try:
+                account_torrents = get_all_torrents()
+            except Exception as ex:
+                logging.exception(ex)
+                continue
+
+            for torrent in itertools.chain(*account_torrents.values()):
+                key = (source, torrent.torrent_id)
+                if key not in original_value:
+                    original_value[key] = TorrentHistoryDTO(
+                        source=source,
+                        torrent_id=torrent.torrent_id,
+                        name=torrent.name,
+                        last_seen=today,
+                    )
+                item = original_value[key]
+                item.name = torrent.name
+                item.record(
+                    today,
+                    seeder_count=torrent.seeder_count,
+                    leecher_count=torrent.leecher_count,
+                    download_count=torrent.download_count,
+                    comment_count=torrent.comment_count,
+                )
+
+        return original_value
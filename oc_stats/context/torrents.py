@@ -3,11 +3,13 @@ import logging
 import typing as T
 from dataclasses import dataclass
 
-from oc_stats.api import anidex, nyaa_si
+from oc_stats.accounts import DEFAULT_ACCOUNT_NAME
 from oc_stats.context.base import BaseContextBuilder
 
+SOURCES = ("nyaa.si", "anidex.info")
 
-@dataclass
+
+@dataclass(frozen=True, slots=True)
 class TorrentDTO:
     source: str
     name: str
@@ -17,6 +19,72 @@ class TorrentDTO:
     download_count: int
     comment_count: int
     visible: bool
+    account: str = DEFAULT_ACCOUNT_NAME
+
+
+@dataclass(frozen=True, slots=True)
+class TorrentSummaryDTO:
+    torrent_count: int
+    visible_torrent_count: int
+    download_count: int
+    seeder_count: int
+    leecher_count: int
+    comment_count: int
+    average_download_count: float
+    average_seeder_count: float
+    average_leecher_count: float
+    average_comment_count: float
+
+
+@dataclass(frozen=True, slots=True)
+class TorrentsContextDTO:
+    items: list[TorrentDTO]
+    summaries: dict[str, TorrentSummaryDTO]
+    total: TorrentSummaryDTO
+
+
+def _make_summary(totals: list[int]) -> TorrentSummaryDTO:
+    count, visible, downloads, seeders, leechers, comments = totals
+    return TorrentSummaryDTO(
+        torrent_count=count,
+        visible_torrent_count=visible,
+        download_count=downloads,
+        seeder_count=seeders,
+        leecher_count=leechers,
+        comment_count=comments,
+        average_download_count=downloads / count if count else 0.0,
+        average_seeder_count=seeders / count if count else 0.0,
+        average_leecher_count=leechers / count if count else 0.0,
+        average_comment_count=comments / count if count else 0.0,
+    )
+
+
+def summarize_torrents(torrents: T.Iterable[TorrentDTO]) -> TorrentsContextDTO:
+    items: list[TorrentDTO] = []
+    totals: dict[str, list[int]] = {source: [0] * 6 for source in SOURCES}
+    for torrent in torrents:
+        items.append(torrent)
+        source_totals = totals.setdefault(torrent.source, [0] * 6)
+        for idx, value in enumerate(
+            (
+                1,
+                torrent.visible,
+                torrent.download_count,
+                torrent.seeder_count,
+                torrent.leecher_count,
+                torrent.comment_count,
+            )
+        ):
+            source_totals[idx] += value
+
+    return TorrentsContextDTO(
+        items=items,
+        summaries={
+            source: _make_summary(source_totals)
+            for source, source_totals in totals.items()
+        },
+        total=_make_summary([sum(column) for column in zip(*totals.values())]),
+    )
 
 
 class TorrentsContextBuilder(BaseContextBuilder):
@@ -25,48 +93,42 @@ class TorrentsContextBuilder(BaseContextBuilder):
     @staticmethod
     def deserialize(value: T.Optional[str]) -> T.Any:
         if not value:
-            return {}
+            return []
         return [TorrentDTO(**item) for item in json.loads(value)]
 
+    @staticmethod
+    def transform_context(value: T.Any) -> T.Any:
+        return summarize_torrents(value)
+
     def update(self, original_value: T.Any) -> T.Any:
+        from oc_stats.api import anidex, nyaa_si
+
         ret = []
 
-        try:
-            nyaa_si_torrents = list(nyaa_si.get_user_torrents())
-        except Exception as ex:
-            logging.exception(ex)
-        else:
-            for torrent in nyaa_si_torrents:
-                ret.append(
-                    TorrentDTO(
-                        source="nyaa.si",
-                        name=torrent.name,
-                        size=torrent.size,
-                        seeder_count=torrent.seeder_count,
-                        leecher_count=torrent.leecher_count,
-                        download_count=torrent.download_count,
-                        comment_count=torrent.comment_count,
-                        visible=torrent.visible,
-                    )
-                )
-
-        try:
-            anidex_torrents = list(anidex.get_group_torrents())
-        except Exception as ex:
-            logging.exception(ex)
-        else:
-            for torrent in anidex_torrents:
-                ret.append(
-                    TorrentDTO(
-                        source="anidex.info",
-                        name=torrent.name,
-                        size=torrent.size,
-                        seeder_count=torrent.seeder_count,
-                        leecher_count=torrent.leecher_count,
-                        download_count=torrent.download_count,
-                        comment_count=torrent.comment_count,
-                        visible=torrent.visible,
+        for source, get_all_torrents in [
+            ("nyaa.si", nyaa_si.get_all_user_torrents),
+            ("anidex.info", anidex.get_all_group_torrents),
+        ]:
+            try:
+                account_torrents = get_all_torrents()
+            except Exception as ex:
+                logging.exception(ex)
+                continue
+
+            for account, torrents in account_torrents.items():
+                for torrent in torrents:
+                    ret.append(
+                        TorrentDTO(
+                            source=source,
+                            name=torrent.name,
+                            size=torrent.size,
+                            seeder_count=torrent.seeder_count,
+                            leecher_count=torrent.leecher_count,
+                            download_count=torrent.download_count,
+                            comment_count=torrent.comment_count,
+                            visible=torrent.visible,
+                            account=account.name,
+                        )
                     )
-                )
 
         return ret
@@ -3,11 +3,10 @@ import typing as T
 from dataclasses import dataclass
 from datetime import timedelta
 
-from oc_stats.api.dedibox import get_transmission_stats
 from oc_stats.context.base import BaseContextBuilder
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class TransmissionStatsDTO:
     torrent_count: int
     active_torrent_count: int
@@ -29,6 +28,8 @@ class TransmissionStatsContextBuilder(BaseContextBuilder):
         )
 
     def update(self, original_value: T.Any) -> T.Any:
+        from oc_stats.api.dedibox import get_transmission_stats
+
         stats = get_transmission_stats()
         return TransmissionStatsDTO(
             torrent_count=stats.torrent_count,
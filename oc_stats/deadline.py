@@ -0,0 +1,70 @@
+import threading
+import time
+import typing as T
+from contextlib import contextmanager
+from dataclasses import dataclass
+
+DEFAULT_TIMEOUT = 30.0
+MIN_TIMEOUT = 1.0
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+@dataclass(frozen=True, slots=True)
+class Deadline:
+    expires: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(expires=time.monotonic() + seconds)
+
+    @property
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining <= 0
+
+    def limit(self, seconds: float) -> "Deadline":
+        return Deadline(expires=min(self.expires, time.monotonic() + seconds))
+
+
+_local = threading.local()
+
+
+def get_deadline() -> T.Optional[Deadline]:
+    return T.cast(T.Optional[Deadline], getattr(_local, "deadline", None))
+
+
+@contextmanager
+def use_deadline(deadline: Deadline) -> T.Iterator[Deadline]:
+    previous = get_deadline()
+    _local.deadline = deadline
+    try:
+        yield deadline
+    finally:
+        _local.deadline = previous
+
+
+def check_deadline() -> None:
+    deadline = get_deadline()
+    if deadline and deadline.expired:
+        raise DeadlineExceeded("time budget exhausted")
+
+
+def get_timeout(default: float = DEFAULT_TIMEOUT) -> float:
+    deadline = get_deadline()
+    if not deadline:
+        return default
+    check_deadline()
+    return max(min(default, deadline.remaining), MIN_TIMEOUT)
+
+
+def sleep(seconds: float) -> None:
+    deadline = get_deadline()
+    if deadline and deadline.remaining < seconds:
+        raise DeadlineExceeded("time budget exhausted")
+    time.sleep(seconds)
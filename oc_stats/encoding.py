@@ -0,0 +1,51 @@
+import gzip
+import typing as T
+import zlib
+
+import brotli
+from werkzeug.datastructures import Accept
+
+ENCODING_SUFFIXES = {"br": ".br", "gzip": ".gz"}
+STREAM_BROTLI_QUALITY = 5
+STREAM_GZIP_LEVEL = 6
+
+
+def compress(
+    data: bytes, brotli_quality: int = 11, gzip_level: int = 9
+) -> dict[str, bytes]:
+    ret = {
+        "br": brotli.compress(data, quality=brotli_quality),
+        "gzip": gzip.compress(data, compresslevel=gzip_level, mtime=0),
+    }
+    return {
+        encoding: compressed
+        for encoding, compressed in ret.items()
+        if len(compressed) < len(data)
+    }
+
+
+def compress_stream(
+    chunks: T.Iterable[bytes], encoding: str
+) -> T.Iterator[bytes]:
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=STREAM_BROTLI_QUALITY)
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+    elif encoding == "gzip":
+        gzip_compressor = zlib.compressobj(
+            STREAM_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS
+        )
+        for chunk in chunks:
+            yield gzip_compressor.compress(chunk) + gzip_compressor.flush(
+                zlib.Z_SYNC_FLUSH
+            )
+        yield gzip_compressor.flush()
+    else:
+        raise ValueError(f"unsupported encoding {encoding}")
+
+
+def negotiate_encoding(
+    accept_encodings: Accept, available: T.Iterable[str]
+) -> T.Optional[str]:
+    return accept_encodings.best_match(list(available))
@@ -0,0 +1,104 @@
+import json
+import logging
+import threading
+import time
+import typing as T
+from dataclasses import dataclass
+
+from oc_stats.common import json_default
+
+TState = tuple[str, dict[str, str]]
+
+
+@dataclass(frozen=True, slots=True)
+class UpdateEventDTO:
+    version: str
+    changed: list[str]
+    sections: dict[str, str]
+
+
+class Broadcaster:
+    def __init__(self) -> None:
+        self.condition = threading.Condition()
+        self.sequence = 0
+        self.event: T.Optional[UpdateEventDTO] = None
+
+    def publish(self, event: UpdateEventDTO) -> None:
+        with self.condition:
+            self.sequence += 1
+            self.event = event
+            self.condition.notify_all()
+
+    def wait(
+        self, sequence: int, timeout: float
+    ) -> tuple[int, T.Optional[UpdateEventDTO]]:
+        with self.condition:
+            self.condition.wait_for(lambda: self.sequence != sequence, timeout)
+            return self.sequence, self.event
+
+
+class UpdateWatcher(threading.Thread):
+    def __init__(
+        self,
+        broadcaster: Broadcaster,
+        get_state: T.Callable[[], TState],
+        get_sections: T.Callable[[dict[str, str]], dict[str, str]],
+        interval: float,
+    ) -> None:
+        super().__init__(name="update-watcher", daemon=True)
+        self.broadcaster = broadcaster
+        self.get_state = get_state
+        self.get_sections = get_sections
+        self.interval = interval
+
+    def run(self) -> None:
+        version: T.Optional[str] = None
+        digests: dict[str, str] = {}
+        while True:
+            try:
+                new_version, new_digests = self.get_state()
+                if new_version != version:
+                    changed = sorted(
+                        key
+                        for key in digests.keys() | new_digests.keys()
+                        if digests.get(key) != new_digests.get(key)
+                    )
+                    logging.info(
+                        f"events: data version {new_version}, "
+                        f"changed: {', '.join(changed) or 'nothing'}"
+                    )
+                    self.broadcaster.publish(
+                        UpdateEventDTO(
+                            version=new_version,
+                            changed=changed,
+                            sections=self.get_sections(new_digests),
+                        )
+                    )
+                    version, digests = new_version, new_digests
+            except Exception as ex:
+                logging.exception(ex)
+            time.sleep(self.interval)
+
+
+def format_event(name: str, data: T.Any) -> bytes:
+    payload = json.dumps(data, default=json_default)
+    return f"event: {name}\ndata: {payload}\n\n".encode()
+
+
+def iter_events(
+    broadcaster: Broadcaster, keepalive: float, retry: int, lifetime: float
+) -> T.Iterator[bytes]:
+    yield f"retry: {retry}\n\n".encode()
+    # end the stream now and then so that dead connections are noticed and
+    # clients reconnect (and resynchronise) on their own
+    end = time.monotonic() + lifetime
+    sequence = 0
+    while time.monotonic() < end:
+        new_sequence, event = broadcaster.wait(
+            sequence, min(keepalive, max(end - time.monotonic(), 0))
+        )
+        if new_sequence == sequence or event is None:
+            yield b": keepalive\n\n"
+            continue
+        sequence = new_sequence
+        yield format_event("update", event)
@@ -0,0 +1,71 @@
+import os
+import threading
+import typing as T
+from collections import OrderedDict
+from dataclasses import dataclass
+
+import jinja2.runtime
+from markupsafe import Markup
+
+FRAGMENT_CACHE_MAX_BYTES = int(
+    os.environ.get("OC_STATS_FRAGMENT_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+)
+
+
+@dataclass(frozen=True, slots=True)
+class FragmentCacheStatsDTO:
+    hit_count: int
+    miss_count: int
+    entry_count: int
+    total_size: int
+
+
+class FragmentCache:
+    def __init__(
+        self,
+        get_version: T.Callable[[], str],
+        max_bytes: int = FRAGMENT_CACHE_MAX_BYTES,
+    ) -> None:
+        self.get_version = get_version
+        self.max_bytes = max_bytes
+        self.entries: OrderedDict[tuple[str, str, int], Markup] = OrderedDict()
+        self.lock = threading.Lock()
+        self.total_size = 0
+        self.hit_count = 0
+        self.miss_count = 0
+
+    def render(self, macro: jinja2.runtime.Macro, item: T.Hashable) -> Markup:
+        # keyed by the item's hash rather than the item itself so that the
+        # cache does not keep every DTO (and its text) alive a second time
+        key = (self.get_version(), macro.name, hash(item))
+        with self.lock:
+            fragment = self.entries.get(key)
+            if fragment is not None:
+                self.entries.move_to_end(key)
+                self.hit_count += 1
+                return fragment
+            self.miss_count += 1
+
+        fragment = Markup(macro(item))
+        with self.lock:
+            if key not in self.entries:
+                self.entries[key] = fragment
+                self.total_size += len(fragment)
+            while self.total_size > self.max_bytes and self.entries:
+                _key, evicted = self.entries.popitem(last=False)
+                self.total_size -= len(evicted)
+        return fragment
+
+    def clear(self) -> None:
+        with self.lock:
+            self.entries.clear()
+            self.total_size = 0
+
+    def get_stats(self) -> FragmentCacheStatsDTO:
+        with self.lock:
+            return FragmentCacheStatsDTO(
+                hit_count=self.hit_count,
+                miss_count=self.miss_count,
+                entry_count=len(self.entries),
+                total_size=self.total_size,
+            )
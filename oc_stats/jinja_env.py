@@ -1,27 +1,29 @@
 import json
-import typing as T
-from datetime import datetime
 
 import jinja2
 
-from oc_stats.common import json_default
+from oc_stats.assets import asset_url
+from oc_stats.chart import render_daily_stats_chart
+from oc_stats.common import CACHE_DIR, json_default
+from oc_stats.fragments import FragmentCache
 from oc_stats.markdown import render_markdown
 
+BYTECODE_CACHE_DIR = CACHE_DIR / "jinja"
 
-def percent(
-    dividend: T.Union[int, float], divisor: T.Union[int, float]
-) -> str:
-    if not divisor:
-        return "0.0"
-    return f"{dividend / divisor:.2f}"
 
-
-def setup_jinja_env(jinja_env: jinja2.Environment) -> None:
+def setup_jinja_env(
+    jinja_env: jinja2.Environment, fragment_cache: FragmentCache
+) -> None:
     jinja_env.lstrip_blocks = True
     jinja_env.trim_blocks = True
-    jinja_env.globals["deployment_id"] = datetime.now().isoformat()
+    BYTECODE_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    jinja_env.bytecode_cache = jinja2.FileSystemBytecodeCache(
+        str(BYTECODE_CACHE_DIR)
+    )
+    jinja_env.globals["asset_url"] = asset_url
+    jinja_env.globals["render_daily_stats_chart"] = render_daily_stats_chart
+    jinja_env.globals["render_cached"] = fragment_cache.render
     jinja_env.filters["markdown"] = render_markdown
     jinja_env.filters["tojson"] = lambda obj: json.dumps(
         obj, default=json_default
     )
-    jinja_env.globals.update(percent=percent)
@@ -0,0 +1,94 @@
+import logging
+import os
+import sys
+import threading
+import time
+import typing as T
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from types import FrameType
+
+from oc_stats.common import DATA_DIR
+
+PROFILE_DIR = DATA_DIR / "profiles"
+SAMPLE_INTERVAL = float(os.environ.get("OC_STATS_PROFILE_INTERVAL", 0.005))
+REQUEST_THRESHOLD = float(
+    os.environ.get("OC_STATS_PROFILE_REQUEST_THRESHOLD", 0.5)
+)
+
+_enabled = bool(os.environ.get("OC_STATS_PROFILE"))
+
+
+def enable_profiling() -> None:
+    global _enabled
+    _enabled = True
+
+
+def is_profiling_enabled() -> bool:
+    return _enabled
+
+
+def _format_frame(frame: FrameType) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})"
+
+
+def _collapse_stack(frame: T.Optional[FrameType]) -> str:
+    stack: list[str] = []
+    while frame:
+        stack.append(_format_frame(frame))
+        frame = frame.f_back
+    return ";".join(reversed(stack))
+
+
+class _Sampler(threading.Thread):
+    def __init__(self, thread_id: int) -> None:
+        super().__init__(name=f"profiler-{thread_id}", daemon=True)
+        self.thread_id = thread_id
+        self.stacks: Counter[str] = Counter()
+        self.stopped = threading.Event()
+
+    def run(self) -> None:
+        while not self.stopped.wait(SAMPLE_INTERVAL):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame:
+                self.stacks[_collapse_stack(frame)] += 1
+
+    def stop(self) -> None:
+        self.stopped.set()
+        self.join()
+
+
+def _save_profile(name: str, stacks: Counter[str]) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    path = PROFILE_DIR / (
+        datetime.now().strftime("%Y%m%d-%H%M%S-%f") + f"-{name}.folded"
+    )
+    path.write_text(
+        "".join(f"{stack} {count}\n" for stack, count in stacks.items())
+    )
+    return path
+
+
+@contextmanager
+def profile(name: str, threshold: float = 0.0) -> T.Iterator[None]:
+    if not _enabled:
+        yield
+        return
+
+    sampler = _Sampler(threading.get_ident())
+    start = time.perf_counter()
+    sampler.start()
+    try:
+        yield
+    finally:
+        sampler.stop()
+        elapsed = time.perf_counter() - start
+        if elapsed >= threshold and sampler.stacks:
+            path = _save_profile(name, sampler.stacks)
+            logging.info(
+                f"profiling: {name} took {elapsed:.2f}s, "
+                f"{sum(sampler.stacks.values())} samples saved to {path}"
+            )
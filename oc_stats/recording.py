@@ -0,0 +1,286 @@
+import base64
+import gzip
+import json
+import logging
+import os
+import subprocess
+import threading
+import time
+import typing as T
+from collections import defaultdict, deque
+from datetime import datetime
+from http.cookies import SimpleCookie
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+from oc_stats.api import dedibox
+from oc_stats.assets import ASSETS_DIR
+from oc_stats.common import CACHE_DIR, DATA_DIR
+from oc_stats.jinja_env import BYTECODE_CACHE_DIR
+from oc_stats.sessions import SESSIONS_DIR
+from oc_stats.thumbnails import THUMBNAILS_DIR
+
+ARCHIVE_VERSION = 2
+DERIVED_CACHE_DIRS = {ASSETS_DIR, BYTECODE_CACHE_DIR, THUMBNAILS_DIR}
+
+
+class ReplayMissError(Exception):
+    pass
+
+
+def _encode(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def _decode(data: str) -> bytes:
+    return base64.b64decode(data)
+
+
+def _get_http_key(method: T.Optional[str], url: T.Optional[str]) -> str:
+    return f"http {method} {url}"
+
+
+def _get_ssh_key(args: T.Sequence[str]) -> str:
+    return "ssh " + json.dumps(list(args))
+
+
+def _get_file_key(path: Path) -> str:
+    return f"file {path.relative_to(DATA_DIR)}"
+
+
+def _iter_state_files() -> T.Iterator[Path]:
+    yield from sorted(DATA_DIR.glob("*.json"))
+    if SESSIONS_DIR.is_dir():
+        yield from sorted(SESSIONS_DIR.glob("*.json"))
+    if CACHE_DIR.is_dir():
+        for cache_dir in sorted(CACHE_DIR.iterdir()):
+            if not cache_dir.is_dir() or cache_dir in DERIVED_CACHE_DIRS:
+                continue
+            yield from sorted(
+                path
+                for path in cache_dir.iterdir()
+                if path.is_file() and path.suffix != ".tmp"
+            )
+
+
+class _Patcher:
+    def __init__(self) -> None:
+        self._original_send = requests.Session.send
+        self._original_ssh = dedibox._ssh
+
+    def __enter__(self) -> "_Patcher":
+        patcher = self
+
+        def send(
+            session: requests.Session,
+            request: requests.PreparedRequest,
+            **kwargs: T.Any,
+        ) -> requests.Response:
+            return patcher.send(session, request, **kwargs)
+
+        setattr(requests.Session, "send", send)
+        setattr(dedibox, "_ssh", self.ssh)
+        return self
+
+    def __exit__(self, *_args: T.Any) -> None:
+        setattr(requests.Session, "send", self._original_send)
+        setattr(dedibox, "_ssh", self._original_ssh)
+
+    def send(
+        self,
+        session: requests.Session,
+        request: requests.PreparedRequest,
+        **kwargs: T.Any,
+    ) -> requests.Response:
+        raise NotImplementedError
+
+    def ssh(self, *args: str) -> str:
+        raise NotImplementedError
+
+
+class Recorder(_Patcher):
+    def __init__(self, path: Path) -> None:
+        super().__init__()
+        self.path = path
+        self.entries: list[dict[str, T.Any]] = []
+        self.lock = threading.Lock()
+        self.handle: T.Optional[T.TextIO] = None
+
+    def __enter__(self) -> "Recorder":
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.touch(mode=0o600)
+        self.path.chmod(0o600)
+        self.handle = T.cast(T.TextIO, gzip.open(self.path, "wt"))
+        header = {
+            "version": ARCHIVE_VERSION,
+            "created": datetime.now().isoformat(),
+        }
+        self.handle.write(json.dumps(header) + "\n")
+        file_count = 0
+        for path in _iter_state_files():
+            self.handle.write(
+                json.dumps(
+                    {
+                        "key": _get_file_key(path),
+                        "mtime": path.stat().st_mtime,
+                        "body": _encode(path.read_bytes()),
+                    }
+                )
+                + "\n"
+            )
+            file_count += 1
+        logging.info(f"recording: saved {file_count} input files")
+        super().__enter__()
+        return self
+
+    def __exit__(self, *args: T.Any) -> None:
+        super().__exit__(*args)
+        assert self.handle
+        with self.handle:
+            for entry in self.entries:
+                self.handle.write(json.dumps(entry) + "\n")
+        logging.info(
+            f"recording: saved {len(self.entries)} exchanges to {self.path}"
+        )
+
+    def _add(self, entry: dict[str, T.Any]) -> None:
+        with self.lock:
+            self.entries.append(entry)
+
+    def send(
+        self,
+        session: requests.Session,
+        request: requests.PreparedRequest,
+        **kwargs: T.Any,
+    ) -> requests.Response:
+        start = time.perf_counter()
+        response = self._original_send(session, request, **kwargs)
+        content = response.content
+        self._add(
+            {
+                "key": _get_http_key(request.method, request.url),
+                "elapsed": time.perf_counter() - start,
+                "status": response.status_code,
+                "reason": response.reason,
+                "url": response.url,
+                "headers": dict(response.headers),
+                "encoding": response.encoding,
+                "body": _encode(content),
+            }
+        )
+        return response
+
+    def ssh(self, *args: str) -> str:
+        start = time.perf_counter()
+        try:
+            stdout = self._original_ssh(*args)
+        except subprocess.CalledProcessError as ex:
+            self._add(
+                {
+                    "key": _get_ssh_key(args),
+                    "elapsed": time.perf_counter() - start,
+                    "returncode": ex.returncode,
+                    "body": _encode(ex.output or b""),
+                }
+            )
+            raise
+        self._add(
+            {
+                "key": _get_ssh_key(args),
+                "elapsed": time.perf_counter() - start,
+                "returncode": 0,
+                "body": _encode(stdout.encode()),
+            }
+        )
+        return stdout
+
+
+class Replayer(_Patcher):
+    def __init__(self, path: Path, latency_scale: float = 0.0) -> None:
+        super().__init__()
+        self.latency_scale = latency_scale
+        self.queues: dict[str, deque[dict[str, T.Any]]] = defaultdict(deque)
+        self.files: list[dict[str, T.Any]] = []
+        self.lock = threading.Lock()
+        with gzip.open(path, "rt") as handle:
+            header = json.loads(next(handle))
+            if header["version"] != ARCHIVE_VERSION:
+                raise ValueError(
+                    f"unsupported recording version {header['version']}"
+                )
+            for line in handle:
+                entry = json.loads(line)
+                if entry["key"].startswith("file "):
+                    self.files.append(entry)
+                else:
+                    self.queues[entry["key"]].append(entry)
+
+    def restore_state(self) -> None:
+        existing = list(_iter_state_files())
+        if existing:
+            raise ValueError(
+                f"refusing to replay into {DATA_DIR}, which already holds "
+                f"{existing[0]}; point OC_STATS_DATA_DIR at an empty directory"
+            )
+        for entry in self.files:
+            path = DATA_DIR / entry["key"].split(" ", 1)[1]
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(_decode(entry["body"]))
+            os.utime(path, (entry["mtime"], entry["mtime"]))
+        logging.info(f"recording: restored {len(self.files)} input files")
+
+    def __exit__(self, *args: T.Any) -> None:
+        super().__exit__(*args)
+        unused_count = sum(len(queue) for queue in self.queues.values())
+        if unused_count:
+            logging.info(
+                f"recording: {unused_count} recorded exchanges were not replayed"
+            )
+
+    def _pop(self, key: str) -> dict[str, T.Any]:
+        with self.lock:
+            queue = self.queues.get(key)
+            if not queue:
+                raise ReplayMissError(f"no recorded exchange for {key}")
+            entry = queue.popleft()
+        if self.latency_scale:
+            time.sleep(entry["elapsed"] * self.latency_scale)
+        return entry
+
+    def send(
+        self,
+        session: requests.Session,
+        request: requests.PreparedRequest,
+        **kwargs: T.Any,
+    ) -> requests.Response:
+        entry = self._pop(_get_http_key(request.method, request.url))
+        response = requests.Response()
+        response.status_code = entry["status"]
+        response.reason = entry["reason"]
+        response.url = entry["url"]
+        response.headers = CaseInsensitiveDict(entry["headers"])
+        response.encoding = entry["encoding"]
+        response.request = request
+        response._content = _decode(entry["body"])
+        for name, morsel in SimpleCookie(
+            response.headers.get("Set-Cookie", "")
+        ).items():
+            session.cookies.set(
+                name,
+                morsel.value,
+                domain=morsel["domain"] or urlparse(response.url).hostname,
+                path=morsel["path"] or "/",
+            )
+        return response
+
+    def ssh(self, *args: str) -> str:
+        entry = self._pop(_get_ssh_key(args))
+        body = _decode(entry["body"])
+        if entry["returncode"]:
+            raise subprocess.CalledProcessError(
+                entry["returncode"], ["ssh", dedibox.DEDIBOX_HOST, *args], body
+            )
+        return body.decode()
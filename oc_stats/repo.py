@@ -1,16 +1,94 @@
+import copy
+import hashlib
+import json
 import logging
+import threading
+import time
 import typing as T
+from dataclasses import dataclass, replace
+from datetime import datetime, timezone
 
+from oc_stats.common import DATA_DIR, json_default
 from oc_stats.context import BaseContextBuilder
+from oc_stats.deadline import Deadline, DeadlineExceeded, use_deadline
+from oc_stats.profiling import profile
+from oc_stats.search import SearchIndex
 
 MISSING = object()
+UPDATE_STATUS_PATH = DATA_DIR / "update_status.json"
+
+
+@dataclass(frozen=True, slots=True)
+class UpdateStatusDTO:
+    last_updated: T.Optional[datetime]
+    stale: bool
+    error: T.Optional[str]
+
+    @property
+    def age(self) -> T.Optional[float]:
+        if not self.last_updated:
+            return None
+        return (datetime.now(timezone.utc) - self.last_updated).total_seconds()
+
+
+def load_update_status() -> dict[str, UpdateStatusDTO]:
+    if not UPDATE_STATUS_PATH.exists():
+        return {}
+    return {
+        key: UpdateStatusDTO(
+            last_updated=(
+                datetime.fromisoformat(last_updated)
+                if (last_updated := item.pop("last_updated"))
+                else None
+            ),
+            **item,
+        )
+        for key, item in json.loads(UPDATE_STATUS_PATH.read_text()).items()
+    }
+
+
+def save_update_status(status: dict[str, UpdateStatusDTO]) -> None:
+    UPDATE_STATUS_PATH.parent.mkdir(parents=True, exist_ok=True)
+    UPDATE_STATUS_PATH.write_text(
+        json.dumps(status, default=json_default, indent=4)
+    )
 
 
 class ContextBuilderRepository:
     def __init__(self) -> None:
         self.data: dict[T.Any, T.Any] = {}
+        self.status: dict[str, UpdateStatusDTO] = {}
+        self.abandoned: list[threading.Thread] = []
         self.builders = [cls() for cls in BaseContextBuilder.__subclasses__()]
 
+    def get_data_version(self) -> str:
+        digest = hashlib.sha256()
+        for builder in self.builders:
+            try:
+                stat = builder.db_path.stat()
+            except FileNotFoundError:
+                continue
+            key = f"{builder.context_key}:{stat.st_mtime_ns}:{stat.st_size}"
+            digest.update(key.encode() + b"\0")
+        try:
+            stat = UPDATE_STATUS_PATH.stat()
+        except FileNotFoundError:
+            pass
+        else:
+            digest.update(f"status:{stat.st_mtime_ns}".encode())
+        return digest.hexdigest()[:16]
+
+    def get_data_digests(self) -> dict[str, str]:
+        paths = {
+            builder.context_key: builder.db_path for builder in self.builders
+        }
+        paths["update_status"] = UPDATE_STATUS_PATH
+        return {
+            key: hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+            for key, path in paths.items()
+            if path.exists()
+        }
+
     def load_data(self) -> None:
         for builder in self.builders:
             if builder.db_path.exists():
@@ -18,15 +96,97 @@ class ContextBuilderRepository:
             else:
                 value = builder.deserialize(None)
             self.data[builder.context_key] = value
+        self.status = load_update_status()
 
-    def update_data(self) -> None:
+    def _run_builder(
+        self, builder: BaseContextBuilder, deadline: Deadline
+    ) -> tuple[T.Any, T.Optional[str]]:
+        result: list[T.Any] = []
+        errors: list[str] = []
+        original_value = copy.deepcopy(self.data.get(builder.context_key))
+        # the grace period comes out of the budget so that a builder which
+        # overruns its own deadline is still abandoned on time
+        grace_period = min(
+            builder.update_grace_period, max(deadline.remaining, 0) / 2
+        )
+        builder_deadline = Deadline(expires=deadline.expires - grace_period)
+
+        def run() -> None:
+            with use_deadline(builder_deadline), profile(
+                f"update-{builder.context_key}"
+            ):
+                try:
+                    result.append(builder.update(original_value))
+                except DeadlineExceeded:
+                    errors.append("time budget exhausted")
+                except Exception as ex:
+                    logging.exception(ex)
+                    errors.append(repr(ex))
+
+        thread = threading.Thread(
+            target=run, name=f"update-{builder.context_key}", daemon=True
+        )
+        thread.start()
+        thread.join(max(deadline.remaining, 0))
+        if thread.is_alive():
+            self.abandoned.append(thread)
+            return MISSING, "time budget exhausted, update abandoned"
+        if errors:
+            return MISSING, errors[0]
+        return result[0], None
+
+    def _mark_stale(
+        self, builder: BaseContextBuilder, error: T.Optional[str]
+    ) -> None:
+        previous = self.status.get(
+            builder.context_key,
+            UpdateStatusDTO(last_updated=None, stale=False, error=None),
+        )
+        self.status[builder.context_key] = replace(
+            previous, stale=True, error=error
+        )
+
+    def update_data(self, deadline: T.Optional[Deadline] = None) -> None:
         for builder in self.builders:
-            try:
-                value = self.data.get(builder.context_key)
-                value = builder.update(value)
+            if deadline and deadline.expired:
+                logging.warning(
+                    f"repo: skipping {builder.context_key}: "
+                    "run deadline exceeded"
+                )
+                self._mark_stale(builder, "run deadline exceeded")
+                continue
+            builder_deadline = (
+                deadline.limit(builder.update_budget)
+                if deadline
+                else Deadline.after(builder.update_budget)
+            )
+            logging.info(
+                f"repo: updating {builder.context_key} "
+                f"(budget: {builder_deadline.remaining:.0f}s)"
+            )
+            value, error = self._run_builder(builder, builder_deadline)
+            if value is MISSING:
+                logging.warning(
+                    f"repo: keeping stale {builder.context_key}: {error}"
+                )
+                self._mark_stale(builder, error)
+            else:
                 self.data[builder.context_key] = value
-            except Exception as ex:
-                logging.exception(ex)
+                self.status[builder.context_key] = UpdateStatusDTO(
+                    last_updated=datetime.now(timezone.utc),
+                    stale=False,
+                    error=None,
+                )
+
+    def join_abandoned(self, timeout: float) -> bool:
+        end = time.monotonic() + timeout
+        for thread in self.abandoned:
+            logging.info(f"repo: waiting for abandoned {thread.name}")
+            thread.join(max(end - time.monotonic(), 0))
+        self.abandoned = [
+            thread for thread in self.abandoned if thread.is_alive()
+        ]
+        return not self.abandoned
 
     def save_data(self) -> None:
         for builder in self.builders:
@@ -34,11 +194,20 @@ class ContextBuilderRepository:
             if value is not MISSING:
                 builder.db_path.parent.mkdir(parents=True, exist_ok=True)
                 builder.db_path.write_text(builder.serialize(value))
+        with SearchIndex() as index:
+            for builder in self.builders:
+                value = self.data.get(builder.context_key, MISSING)
+                if value is not MISSING:
+                    builder.update_search_index(index, value)
+        if self.status:
+            save_update_status(self.status)
 
     def build_context(self) -> dict[str, T.Any]:
-        return {
-            builder.context_key: builder.transform_context(
-                self.data.get(builder.context_key)
-            )
-            for builder in self.builders
-        }
+        context: dict[str, T.Any] = {}
+        for builder in self.builders:
+            with profile(f"transform-{builder.context_key}"):
+                context[builder.context_key] = builder.transform_context(
+                    self.data.get(builder.context_key)
+                )
+        context["update_status"] = self.status
+        return context
@@ -0,0 +1,236 @@
+import hashlib
+import html
+import json
+import sqlite3
+import typing as T
+from pathlib import Path
+
+from oc_stats.common import DATA_DIR
+
+SEARCH_DB_PATH = DATA_DIR / "search.sqlite3"
+SNIPPET_START = "\x02"
+SNIPPET_END = "\x03"
+SNIPPET_TOKENS = 16
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS comments (
+    id INTEGER PRIMARY KEY,
+    item_id TEXT UNIQUE NOT NULL,
+    digest TEXT,
+    source TEXT,
+    website_link TEXT,
+    website_title TEXT,
+    author_name TEXT,
+    comment_date TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS comments_fts USING fts5(
+    author_name, website_title, text,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+CREATE TABLE IF NOT EXISTS anime_requests (
+    id INTEGER PRIMARY KEY,
+    item_id TEXT UNIQUE NOT NULL,
+    digest TEXT,
+    link TEXT,
+    title TEXT,
+    date TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS anime_requests_fts USING fts5(
+    title, synopsis, comment,
+    tokenize = 'unicode61 remove_diacritics 2'
+);
+"""
+
+SEARCH_COLUMNS: dict[str, list[str]] = {
+    "comments": [
+        "item_id",
+        "source",
+        "website_link",
+        "website_title",
+        "author_name",
+        "comment_date",
+    ],
+    "anime_requests": ["item_id", "link", "title", "date"],
+}
+SNIPPET_COLUMNS: dict[str, int] = {"comments": 2, "anime_requests": 1}
+
+TRow = tuple[dict[str, T.Any], dict[str, T.Any]]
+
+
+def make_match_query(query: str) -> str:
+    terms = [term.replace('"', '""') for term in query.split()]
+    if not terms:
+        return ""
+    return " ".join(f'"{term}"' for term in terms[:-1]) + f' "{terms[-1]}"*'
+
+
+def _format_snippet(snippet: str) -> str:
+    return (
+        html.escape(snippet)
+        .replace(SNIPPET_START, "<mark>")
+        .replace(SNIPPET_END, "</mark>")
+    )
+
+
+class SearchIndex:
+    def __init__(self, path: Path = SEARCH_DB_PATH) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self._migrate()
+
+    def __enter__(self) -> "SearchIndex":
+        return self
+
+    def __exit__(self, *_args: T.Any) -> None:
+        self.db.commit()
+        self.db.close()
+
+    def _migrate(self) -> None:
+        for kind in SEARCH_COLUMNS:
+            columns = {
+                row[1] for row in self.db.execute(f"PRAGMA table_info({kind})")
+            }
+            if "digest" not in columns:
+                self.db.execute(f"ALTER TABLE {kind} ADD COLUMN digest TEXT")
+
+    def _upsert(
+        self,
+        kind: str,
+        rowid: T.Optional[int],
+        item_id: str,
+        digest: str,
+        meta: dict[str, T.Any],
+        text: dict[str, T.Any],
+    ) -> None:
+        if rowid is not None:
+            self.db.execute(
+                f"DELETE FROM {kind}_fts WHERE rowid = ?", (rowid,)
+            )
+            self.db.execute(
+                f"UPDATE {kind} SET digest = ?, "
+                + ", ".join(f"{key} = ?" for key in meta)
+                + " WHERE id = ?",
+                (digest, *meta.values(), rowid),
+            )
+        else:
+            rowid = self.db.execute(
+                f"INSERT INTO {kind} (item_id, digest, {', '.join(meta)}) "
+                f"VALUES (?, ?{', ?' * len(meta)})",
+                (item_id, digest, *meta.values()),
+            ).lastrowid
+        self.db.execute(
+            f"INSERT INTO {kind}_fts (rowid, {', '.join(text)}) "
+            f"VALUES (?{', ?' * len(text)})",
+            (rowid, *text.values()),
+        )
+
+    def _sync(self, kind: str, rows: dict[str, TRow]) -> None:
+        existing = {
+            item_id: (rowid, digest)
+            for rowid, item_id, digest in self.db.execute(
+                f"SELECT id, item_id, digest FROM {kind}"
+            )
+        }
+        for item_id, (rowid, _digest) in existing.items():
+            if item_id not in rows:
+                self.db.execute(
+                    f"DELETE FROM {kind}_fts WHERE rowid = ?", (rowid,)
+                )
+                self.db.execute(f"DELETE FROM {kind} WHERE id = ?", (rowid,))
+        for item_id, (meta, text) in rows.items():
+            digest = hashlib.sha256(
+                json.dumps([meta, text], sort_keys=True).encode()
+            ).hexdigest()
+            rowid, previous_digest = existing.get(item_id, (None, None))
+            if digest != previous_digest:
+                self._upsert(kind, rowid, item_id, digest, meta, text)
+
+    def sync_comments(self, comments: T.Iterable[T.Any]) -> None:
+        self._sync(
+            "comments",
+            {
+                comment.comment_id: (
+                    {
+                        "source": comment.source,
+                        "website_link": comment.website_link,
+                        "website_title": comment.website_title,
+                        "author_name": comment.author_name,
+                        "comment_date": comment.comment_date.isoformat(),
+                    },
+                    {
+                        "author_name": comment.author_name,
+                        "website_title": comment.website_title or "",
+                        "text": comment.text,
+                    },
+                )
+                for comment in comments
+            },
+        )
+
+    def sync_anime_requests(self, requests: T.Iterable[T.Any]) -> None:
+        self._sync(
+            "anime_requests",
+            {
+                request.search_id: (
+                    {
+                        "link": request.link,
+                        "title": request.title,
+                        "date": (
+                            request.date.isoformat() if request.date else None
+                        ),
+                    },
+                    {
+                        "title": request.title,
+                        "synopsis": request.synopsis or "",
+                        "comment": request.comment or "",
+                    },
+                )
+                for request in requests
+            },
+        )
+
+
+def search(
+    kind: str,
+    query: str,
+    page: int = 1,
+    per_page: int = 20,
+    path: Path = SEARCH_DB_PATH,
+) -> tuple[list[dict[str, T.Any]], bool]:
+    match_query = make_match_query(query)
+    if not match_query or not path.exists():
+        return [], False
+
+    columns = SEARCH_COLUMNS[kind]
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        rows = db.execute(
+            f"SELECT {', '.join(f'meta.{column}' for column in columns)}, "
+            f"snippet({kind}_fts, {SNIPPET_COLUMNS[kind]}, ?, ?, '…', ?), "
+            f"bm25({kind}_fts) "
+            f"FROM {kind}_fts JOIN {kind} AS meta ON meta.id = {kind}_fts.rowid "
+            f"WHERE {kind}_fts MATCH ? "
+            "ORDER BY rank LIMIT ? OFFSET ?",
+            (
+                SNIPPET_START,
+                SNIPPET_END,
+                SNIPPET_TOKENS,
+                match_query,
+                per_page + 1,
+                (page - 1) * per_page,
+            ),
+        ).fetchall()
+    finally:
+        db.close()
+
+    results = [
+        {
+            **dict(zip(columns, row)),
+            "snippet": _format_snippet(row[-2]),
+            "score": -row[-1],
+        }
+        for row in rows[:per_page]
+    ]
+    return results, len(rows) > per_page
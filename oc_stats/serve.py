@@ -0,0 +1,22 @@
+#!/usr/bin/env python3.10
+from gevent import monkey
+
+# must run before anything imports threading, socket or time
+monkey.patch_all()
+
+import argparse  # noqa: E402
+import logging  # noqa: E402
+
+from gevent.pywsgi import WSGIServer  # noqa: E402
+
+from oc_stats.app import app  # noqa: E402
+
+logging.basicConfig(level=logging.INFO)
+
+parser = argparse.ArgumentParser()
+parser.add_argument("--host", default="127.0.0.1")
+parser.add_argument("--port", type=int, default=5000)
+args = parser.parse_args()
+
+logging.info(f"serve: listening on {args.host}:{args.port}")
+WSGIServer((args.host, args.port), app).serve_forever()
@@ -0,0 +1,56 @@
+import json
+import logging
+import os
+from pathlib import Path
+
+import requests
+
+from oc_stats.common import DATA_DIR
+
+SESSIONS_DIR = DATA_DIR / "sessions"
+
+
+def _get_session_path(name: str) -> Path:
+    return SESSIONS_DIR / f"{name}.json"
+
+
+def load_session(name: str) -> requests.Session:
+    session = requests.Session()
+    path = _get_session_path(name)
+    if not path.exists():
+        return session
+    try:
+        cookies = json.loads(path.read_text())
+    except ValueError as ex:
+        logging.warning(f"sessions: ignoring corrupt session {name}: {ex}")
+        return session
+    for cookie in cookies:
+        session.cookies.set_cookie(requests.cookies.create_cookie(**cookie))
+    logging.info(f"sessions: restored {len(cookies)} cookies for {name}")
+    return session
+
+
+def save_session(name: str, session: requests.Session) -> None:
+    cookies = [
+        {
+            "name": cookie.name,
+            "value": cookie.value,
+            "domain": cookie.domain,
+            "path": cookie.path,
+            "expires": cookie.expires,
+            "secure": cookie.secure,
+        }
+        for cookie in session.cookies
+    ]
+    SESSIONS_DIR.mkdir(mode=0o700, parents=True, exist_ok=True)
+    path = _get_session_path(name)
+    tmp_path = path.with_name(path.name + ".tmp")
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "w") as handle:
+        json.dump(cookies, handle)
+    os.replace(tmp_path, path)
+
+
+def clear_session(name: str, session: requests.Session) -> None:
+    session.cookies.clear()
+    _get_session_path(name).unlink(missing_ok=True)
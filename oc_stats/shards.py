@@ -0,0 +1,70 @@
+import contextlib
+import functools
+import logging
+import threading
+import time
+import typing as T
+from concurrent.futures import ThreadPoolExecutor
+
+from oc_stats.deadline import (
+    DeadlineExceeded,
+    get_deadline,
+    sleep,
+    use_deadline,
+)
+
+TShard = T.TypeVar("TShard", bound=T.Hashable)
+TResult = T.TypeVar("TResult")
+
+
+class RateLimiter:
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self.lock = threading.Lock()
+        self.last_call = 0.0
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self.lock:
+            delay = self.last_call + self.interval - time.monotonic()
+            if delay > 0:
+                sleep(delay)
+            self.last_call = time.monotonic()
+
+
+@functools.cache
+def get_rate_limiter(key: T.Hashable, interval: float) -> RateLimiter:
+    return RateLimiter(interval)
+
+
+def map_shards(
+    func: T.Callable[[TShard], TResult], shards: T.Sequence[TShard]
+) -> dict[TShard, TResult]:
+    # worker threads do not inherit the caller's thread-local deadline
+    deadline = get_deadline()
+
+    def run(shard: TShard) -> TResult:
+        with use_deadline(deadline) if deadline else contextlib.nullcontext():
+            return func(shard)
+
+    with ThreadPoolExecutor(
+        max_workers=max(len(shards), 1), thread_name_prefix="shard"
+    ) as executor:
+        futures = {shard: executor.submit(run, shard) for shard in shards}
+
+    ret: dict[TShard, TResult] = {}
+    errors: list[BaseException] = []
+    for shard, future in futures.items():
+        try:
+            ret[shard] = future.result()
+        except DeadlineExceeded as ex:
+            logging.warning(f"shards: {shard} ran out of time")
+            errors.append(ex)
+        except Exception as ex:
+            logging.exception(ex)
+            errors.append(ex)
+
+    if shards and not ret:
+        raise errors[0]
+    return ret
@@ -0,0 +1,121 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import typing as T
+from pathlib import Path
+
+from oc_stats.common import DATA_DIR
+
+SNAPSHOTS_DIR = DATA_DIR / "snapshots"
+CURRENT_SNAPSHOT_PATH = SNAPSHOTS_DIR / "current"
+SNAPSHOT_MAGIC = b"OCSNAP1\n"
+SNAPSHOT_HEADER = struct.Struct("<Q")
+SNAPSHOT_ALIGNMENT = 4096
+KEEP_SNAPSHOTS = 3
+
+
+class Snapshot:
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        with path.open("rb") as handle:
+            self.mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.mmap)
+
+        magic_end = len(SNAPSHOT_MAGIC)
+        if self.view[:magic_end] != SNAPSHOT_MAGIC:
+            raise ValueError(f"{path} is not a snapshot")
+        (header_size,) = SNAPSHOT_HEADER.unpack_from(self.mmap, magic_end)
+        header_start = magic_end + SNAPSHOT_HEADER.size
+        header = json.loads(
+            bytes(self.view[header_start : header_start + header_size])
+        )
+        self.version: str = header["version"]
+        self.entries: dict[str, tuple[int, int]] = {
+            name: (offset, length)
+            for name, (offset, length) in header["entries"].items()
+        }
+        self.digests: dict[str, str] = header.get("digests", {})
+
+    def get(self, name: str) -> T.Optional[memoryview]:
+        if name not in self.entries:
+            return None
+        offset, length = self.entries[name]
+        return self.view[offset : offset + length]
+
+
+def write_snapshot(
+    version: str,
+    entries: dict[str, T.Union[bytes, memoryview]],
+    digests: T.Optional[dict[str, str]] = None,
+) -> Path:
+    SNAPSHOTS_DIR.mkdir(parents=True, exist_ok=True)
+
+    offsets: dict[str, tuple[int, int]] = {}
+    header_size = 0
+    while True:
+        header = json.dumps(
+            {"version": version, "entries": offsets, "digests": digests or {}}
+        ).encode()
+        if len(header) == header_size:
+            break
+        header_size = len(header)
+        offset = len(SNAPSHOT_MAGIC) + SNAPSHOT_HEADER.size + header_size
+        for name, content in entries.items():
+            offset += -offset % SNAPSHOT_ALIGNMENT
+            offsets[name] = (offset, len(content))
+            offset += len(content)
+
+    path = SNAPSHOTS_DIR / f"{version}.snap"
+    tmp_path = path.with_suffix(".tmp")
+    with tmp_path.open("wb") as handle:
+        handle.write(SNAPSHOT_MAGIC)
+        handle.write(SNAPSHOT_HEADER.pack(len(header)))
+        handle.write(header)
+        for name, content in entries.items():
+            handle.seek(offsets[name][0])
+            handle.write(content)
+        handle.flush()
+        os.fsync(handle.fileno())
+    tmp_path.rename(path)
+
+    tmp_pointer_path = CURRENT_SNAPSHOT_PATH.with_suffix(".tmp")
+    tmp_pointer_path.write_text(path.name)
+    os.replace(tmp_pointer_path, CURRENT_SNAPSHOT_PATH)
+    logging.info(f"snapshot: published {path.name}")
+
+    for old_path in sorted(
+        SNAPSHOTS_DIR.glob("*.snap"), key=lambda p: p.stat().st_mtime
+    )[:-KEEP_SNAPSHOTS]:
+        old_path.unlink()
+
+    return path
+
+
+class SnapshotReader:
+    def __init__(self) -> None:
+        self.snapshot: T.Optional[Snapshot] = None
+        self.pointer_stat: T.Optional[tuple[int, int]] = None
+        self.lock = threading.Lock()
+
+    def current(self) -> T.Optional[Snapshot]:
+        try:
+            stat = CURRENT_SNAPSHOT_PATH.stat()
+        except FileNotFoundError:
+            return None
+        pointer_stat = (stat.st_ino, stat.st_mtime_ns)
+        if pointer_stat == self.pointer_stat:
+            return self.snapshot
+
+        with self.lock:
+            if pointer_stat != self.pointer_stat:
+                name = CURRENT_SNAPSHOT_PATH.read_text().strip()
+                try:
+                    self.snapshot = Snapshot(SNAPSHOTS_DIR / name)
+                except (OSError, ValueError) as ex:
+                    logging.exception(ex)
+                    self.snapshot = None
+                self.pointer_stat = pointer_stat
+            return self.snapshot
@@ -1,16 +1,24 @@
-document.addEventListener("DOMContentLoaded", () => {
-  const imageObserver = new IntersectionObserver((entries, observer) => {
-    entries.forEach(entry => {
-      if (entry.isIntersecting) {
-        const image = entry.target;
-        image.src = image.dataset.src;
-        image.classList.remove("lazy");
-        imageObserver.unobserve(image);
+const imageObserver = new IntersectionObserver((entries, observer) => {
+  entries.forEach(entry => {
+    if (entry.isIntersecting) {
+      const image = entry.target;
+      if (image.parentElement.tagName === "PICTURE") {
+        image.parentElement.querySelectorAll("source").forEach(source => {
+          source.srcset = source.dataset.srcset;
+        });
       }
-    });
+      image.src = image.dataset.src;
+      image.classList.remove("lazy");
+      observer.unobserve(image);
+    }
   });
+});
 
-  document.querySelectorAll(".lazy").forEach(image => {
+const observeLazyImages = root => {
+  root.querySelectorAll(".lazy").forEach(image => {
     imageObserver.observe(image);
   });
-});
+};
+
+document.addEventListener("DOMContentLoaded", () => observeLazyImages(document));
+document.addEventListener("section-updated", event => observeLazyImages(event.detail));
@@ -0,0 +1,46 @@
+window.addEventListener('DOMContentLoaded', () => {
+    const main = document.querySelector('main[data-events-url]');
+    if (!main || !window.EventSource) {
+        return;
+    }
+
+    const templatesVersion = version => version.split('-')[0];
+    const pending = new Map();
+
+    const refresh = async (element, digest) => {
+        if (pending.get(element) === digest) {
+            return;
+        }
+        pending.set(element, digest);
+        try {
+            const response = await fetch(element.dataset.url);
+            if (!response.ok) {
+                return;
+            }
+            const html = await response.text();
+            element.innerHTML = html;
+            element.dataset.digest = response.headers.get('X-Section-Digest') || digest;
+            document.dispatchEvent(new CustomEvent('section-updated', {detail: element}));
+        } finally {
+            if (pending.get(element) === digest) {
+                pending.delete(element);
+            }
+        }
+    };
+
+    const source = new EventSource(main.dataset.eventsUrl);
+    source.addEventListener('update', event => {
+        const data = JSON.parse(event.data);
+        if (templatesVersion(data.version) !== templatesVersion(main.dataset.version)) {
+            window.location.reload();
+            return;
+        }
+        main.dataset.version = data.version;
+        for (const element of document.querySelectorAll('[data-section]')) {
+            const digest = data.sections[element.dataset.section];
+            if (digest && digest !== element.dataset.digest) {
+                refresh(element, digest);
+            }
+        }
+    });
+});
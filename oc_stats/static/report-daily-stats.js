@@ -1,155 +1,63 @@
-const parseTime = d3.timeParse('%Y-%m-%d');
-const pageViews = rawData.pageViews.map(stat => ({
-  day: parseTime(stat.day),
-  value: +stat.requests,
-}));
-const anidexDownloads = Object.entries(rawData.anidexDownloads).map(([day, value]) => ({
-  day: parseTime(day),
-  value: +value,
-}));
-const nyaaSiDownloads = Object.entries(rawData.nyaaSiDownloads).map(([day, value]) => ({
-  day: parseTime(day),
-  value: +value,
-}));
-
-const downloadData = [...anidexDownloads, ...nyaaSiDownloads];
-const allData = [...pageViews, ...downloadData];
-
-window.addEventListener('DOMContentLoaded', () => {
-    const margin = {top: 10, right: 50, bottom: 20, left: 50};
-    const outerWidth = 800;
-    const outerHeight = 300;
-    const innerWidth = outerWidth - margin.left - margin.right;
-    const innerHeight = outerHeight - margin.top - margin.bottom;
-
-    const x = d3.scaleTime()
-        .range([0, innerWidth])
-        .domain(d3.extent(allData, d => d.day));
-    const y1 = d3.scaleLinear()
-        .range([innerHeight, 0])
-        .domain([0, d3.max(allData, d => d.value)])
-        .nice();
-    const y2 = d3.scaleLinear()
-        .range([innerHeight, 0])
-        .domain([0, d3.max(downloadData, d => d.value)])
-        .nice();
-
-    const svg = d3
-        .select('.daily-stats>.target')
-        .classed('svg-container', true)
-        .append('svg')
-        .attr('viewBox', `0 0 ${outerWidth} ${outerHeight}`)
-        .append('g')
-        .attr('transform', `translate(${margin.left},${margin.top})`);
-
-    // grid
-    svg.append('g')
-        .attr('class', 'grid')
-        .attr('transform', `translate(0,${innerHeight})`)
-        .call(d3.axisBottom(x)
-            .ticks(d3.timeMonth.every(1))
-            .tickSize(-innerHeight)
-            .tickFormat('')
-        );
-    svg.append('g')
-        .attr('class', 'grid')
-        .call(d3.axisLeft(y1)
-            .tickSize(-innerWidth)
-            .tickFormat('')
-        );
-    svg.append('g')
-        .attr('class', 'grid')
-        .call(d3.axisRight(y2)
-            .tickSize(-innerWidth)
-            .tickFormat('')
-        );
-
-    const series = [
-        {data: pageViews, title: 'Website views', className: 'page-views', axis: y1},
-        {data: anidexDownloads, title: 'Anidex downloads', className: 'anidex-downloads', axis: y2},
-        {data: nyaaSiDownloads, title: 'Nyaa.si downloads', className: 'nyaa-si-downloads', axis: y2},
-    ];
-
-    for (const chart of series) {
-        // areas
-        svg.append('path')
-            .data([chart.data])
-            .attr('class', `area ${chart.className}`)
-            .attr(
-                'd',
-                d3.area()
-                .x(d => x(d.day))
-                .y0(innerHeight)
-                .y1(d => chart.axis(d.value))
-            );
-
-        // lines
-        svg.append('path')
-            .data([chart.data])
-            .attr('class', `line ${chart.className}`)
-            .attr(
-                'd',
-                d3.line()
-                .x(d => x(d.day))
-                .y(d => chart.axis(d.value))
-            );
-
-        // average lines
-        svg.append('path')
-            .data([chart.data])
-            .attr('class', `line ${chart.className}-avg`)
-            .attr(
-                'd',
-                d3.line()
-                .x(d => x(d.day))
-                .y(d => chart.axis(d.value_avg))
-            );
+const initDailyStats = root => {
+    const target = root.querySelector('.daily-stats>.target');
+    const svg = target && target.querySelector('svg');
+    const dataNode = target && target.querySelector('script.data');
+    if (!svg || !dataNode) {
+        return;
     }
 
-    // legend
-    const legendSquareSize = 12;
-    const legendSquareSpacing = 8;
-    const legendTextSpacing = 5;
-    const legendPadding = 8;
-    const legendX = 12;
-    const legendY = 12;
-
-    svg.append('rect')
-        .attr('x', legendX)
-        .attr('y', legendY)
-        .attr('width', 150)
-        .attr('height', 2 * legendPadding + legendSquareSize * series.length + legendSquareSpacing * (series.length - 1))
-        .attr('class', 'legend-wrapper');
-
-    svg.selectAll('legendSquares')
-        .data(series)
-        .enter()
-        .append('rect')
-        .attr('x', legendX + legendPadding)
-        .attr('y', (d, i) => legendY + legendPadding + i * (legendSquareSize + legendSquareSpacing))
-        .attr('width', legendSquareSize)
-        .attr('height', legendSquareSize)
-        .attr('class', d => `legend ${d.className}`);
-
-    svg.selectAll('legendLabels')
-        .data(series)
-        .enter()
-        .append('text')
-        .attr('x', legendX + legendPadding + legendSquareSize + legendTextSpacing)
-        .attr('y', (d, i) => legendY + legendPadding + i * (legendSquareSize + legendSquareSpacing) + (legendSquareSize / 2))
-        .attr('class', d => `legend ${d.className}`)
-        .text(d => d.title);
-
-    // axes
-    svg.append('g')
-        .attr('transform', `translate(0,${innerHeight})`)
-        .call(
-            d3.axisBottom(x)
-            .ticks(d3.timeMonth.every(3))
-        );
-    svg.append('g')
-        .call(d3.axisLeft(y1));
-    svg.append('g')
-        .attr('transform', `translate(${innerWidth}, 0)`)
-        .call(d3.axisRight(y2));
+    const data = JSON.parse(dataNode.textContent);
+    const start = Date.parse(data.start);
+    const dayLength = 24 * 3600 * 1000;
+    const guide = svg.querySelector('.hover-guide');
+    const tooltip = document.createElement('div');
+    tooltip.className = 'tooltip-box';
+    tooltip.hidden = true;
+    target.appendChild(tooltip);
+
+    svg.addEventListener('mousemove', event => {
+        const point = svg.createSVGPoint();
+        point.x = event.clientX;
+        point.y = event.clientY;
+        const x = point.matrixTransform(svg.getScreenCTM().inverse()).x - data.left;
+        if (x < 0 || x > data.width) {
+            guide.setAttribute('visibility', 'hidden');
+            tooltip.hidden = true;
+            return;
+        }
+
+        const dayIndex = Math.round(x / data.width * data.days);
+        const day = new Date(start + dayIndex * dayLength).toISOString().slice(0, 10);
+        const guideX = dayIndex / data.days * data.width;
+        guide.setAttribute('x1', guideX);
+        guide.setAttribute('x2', guideX);
+        guide.setAttribute('visibility', 'visible');
+
+        tooltip.replaceChildren();
+        const title = document.createElement('strong');
+        title.textContent = day;
+        tooltip.appendChild(title);
+        for (const series of data.series) {
+            const row = document.createElement('div');
+            row.className = series.className;
+            row.textContent = `${series.title}: ${series.values[day] ?? '-'}`;
+            tooltip.appendChild(row);
+        }
+        const bounds = target.getBoundingClientRect();
+        tooltip.style.left = `${event.clientX - bounds.left + 12}px`;
+        tooltip.style.top = `${event.clientY - bounds.top + 12}px`;
+        tooltip.hidden = false;
+    });
+
+    svg.addEventListener('mouseleave', () => {
+        guide.setAttribute('visibility', 'hidden');
+        tooltip.hidden = true;
+    });
+};
+
+window.addEventListener('DOMContentLoaded', () => initDailyStats(document));
+document.addEventListener('section-updated', event => {
+    if (event.detail.dataset.section === 'daily_stats') {
+        initDailyStats(event.detail.parentElement);
+    }
 });
@@ -0,0 +1,151 @@
+import hashlib
+import io
+import json
+import logging
+import typing as T
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+from oc_stats.common import CACHE_DIR, STATIC_DIR
+
+THUMBNAILS_DIR = CACHE_DIR / "thumbnails"
+THUMBNAILS_INDEX_PATH = THUMBNAILS_DIR / "index.json"
+AVATARS_INDEX_PATH = THUMBNAILS_DIR / "avatars.json"
+THUMBNAIL_SIZES = {
+    "small": (160, 240),
+    "large": (240, 360),
+}
+AVATAR_SIZES = {
+    "avatar": (144, 144),
+}
+THUMBNAIL_FORMATS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 6},
+    "jpg": {"format": "JPEG", "quality": 85, "optimize": True},
+}
+THUMBNAIL_RESAMPLING = "LANCZOS"
+THUMBNAIL_PARAMS_HASHES = {
+    (size, ext): hashlib.sha256(
+        json.dumps(
+            [box, THUMBNAIL_RESAMPLING, options], sort_keys=True
+        ).encode()
+    ).hexdigest()[:8]
+    for size, box in {**THUMBNAIL_SIZES, **AVATAR_SIZES}.items()
+    for ext, options in THUMBNAIL_FORMATS.items()
+}
+
+
+def get_thumbnail_name(source_hash: str, size: str, ext: str) -> str:
+    params_hash = THUMBNAIL_PARAMS_HASHES[size, ext]
+    return f"{source_hash}-{size}-{params_hash}.{ext}"
+
+
+def _hash_file(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()[:16]
+
+
+def _is_complete(source_hash: str, sizes: T.Iterable[str]) -> bool:
+    return all(
+        (THUMBNAILS_DIR / get_thumbnail_name(source_hash, size, ext)).exists()
+        for size in sizes
+        for ext in THUMBNAIL_FORMATS
+    )
+
+
+def _make_thumbnails(
+    source_path: Path, source_hash: str, sizes: dict[str, tuple[int, int]]
+) -> None:
+    from PIL import Image
+
+    with Image.open(source_path) as image:
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        else:
+            image = image.convert("RGB")
+        for size, box in sizes.items():
+            thumbnail = image.copy()
+            thumbnail.thumbnail(box, getattr(Image, THUMBNAIL_RESAMPLING))
+            for ext, options in THUMBNAIL_FORMATS.items():
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, **options)
+                target_path = THUMBNAILS_DIR / get_thumbnail_name(
+                    source_hash, size, ext
+                )
+                tmp_path = target_path.with_suffix(".tmp")
+                tmp_path.write_bytes(buffer.getvalue())
+                tmp_path.rename(target_path)
+
+
+def _collect_garbage() -> None:
+    referenced: set[str] = set()
+    for index_path in (THUMBNAILS_INDEX_PATH, AVATARS_INDEX_PATH):
+        if index_path.exists():
+            referenced.update(json.loads(index_path.read_text()).values())
+    params_hashes = set(THUMBNAIL_PARAMS_HASHES.values())
+
+    removed = 0
+    for path in THUMBNAILS_DIR.iterdir():
+        if path.suffix in (".json", ".tmp"):
+            continue
+        source_hash = path.name.split("-", 1)[0]
+        params_hash = path.stem.rsplit("-", 1)[-1]
+        if source_hash not in referenced or params_hash not in params_hashes:
+            path.unlink(missing_ok=True)
+            removed += 1
+    if removed:
+        logging.info(f"thumbnails: removed {removed} stale thumbnails")
+
+
+def link_thumbnails_dir() -> None:
+    static_dir = STATIC_DIR / "thumbnails"
+    if not static_dir.exists():
+        static_dir.symlink_to(THUMBNAILS_DIR, target_is_directory=True)
+
+
+def update_thumbnails(
+    sources: dict[T.Any, Path],
+    sizes: dict[str, tuple[int, int]] = THUMBNAIL_SIZES,
+    index_path: Path = THUMBNAILS_INDEX_PATH,
+) -> dict[T.Any, str]:
+    THUMBNAILS_DIR.mkdir(parents=True, exist_ok=True)
+    index: dict[str, str] = (
+        json.loads(index_path.read_text()) if index_path.exists() else {}
+    )
+
+    new_index: dict[str, str] = {}
+    ret: dict[T.Any, str] = {}
+    pending: dict[str, Path] = {}
+    for key, source_path in sources.items():
+        if not source_path.exists():
+            continue
+        stat = source_path.stat()
+        index_key = f"{source_path}:{stat.st_size}:{stat.st_mtime_ns}"
+        source_hash = index.get(index_key) or _hash_file(source_path)
+        new_index[index_key] = source_hash
+        ret[key] = source_hash
+        if not _is_complete(source_hash, sizes):
+            pending[source_hash] = source_path
+
+    if pending:
+        logging.info(f"thumbnails: generating {len(pending)} thumbnail sets")
+        with ProcessPoolExecutor() as executor:
+            futures = {
+                source_hash: executor.submit(
+                    _make_thumbnails, source_path, source_hash, sizes
+                )
+                for source_hash, source_path in pending.items()
+            }
+            failed: set[str] = set()
+            for source_hash, future in futures.items():
+                try:
+                    future.result()
+                except Exception as ex:
+                    logging.exception(ex)
+                    failed.add(source_hash)
+        ret = {key: value for key, value in ret.items() if value not in failed}
+
+    index_path.write_text(json.dumps(new_index, indent=4))
+    _collect_garbage()
+    return ret
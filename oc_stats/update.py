@@ -1,11 +1,102 @@
-#!/usr/bin/env python3.9
+#!/usr/bin/env python3.10
+import argparse
+import contextlib
 import logging
+import typing as T
+from datetime import date
+from pathlib import Path
 
+import humanfriendly
+
+from oc_stats.app import publish_snapshot
+from oc_stats.cache import get_cache_stats
+from oc_stats.context import DailyTrafficStatsContextBuilder
+from oc_stats.deadline import Deadline
+from oc_stats.profiling import enable_profiling
 from oc_stats.repo import ContextBuilderRepository
 
 logging.basicConfig(level=logging.DEBUG)
 
+parser = argparse.ArgumentParser()
+parser.add_argument(
+    "--backfill-traffic-since",
+    type=date.fromisoformat,
+    metavar="YYYY-MM-DD",
+    help="re-fetch the Cloudflare traffic stats starting from this day",
+)
+parser.add_argument(
+    "--deadline",
+    type=float,
+    default=900,
+    metavar="SECONDS",
+    help="hard upper bound on the time spent updating the data",
+)
+group = parser.add_mutually_exclusive_group()
+group.add_argument(
+    "--record",
+    type=Path,
+    metavar="PATH",
+    help="save the input data, caches and sessions, plus every HTTP exchange "
+    "and dedibox command output, to an archive",
+)
+group.add_argument(
+    "--replay",
+    type=Path,
+    metavar="PATH",
+    help="restore the archived input data into OC_STATS_DATA_DIR, which must "
+    "be empty, and serve HTTP exchanges and dedibox command output from the "
+    "archive instead of the network",
+)
+parser.add_argument(
+    "--replay-latency-scale",
+    type=float,
+    default=0.0,
+    metavar="FACTOR",
+    help="sleep for the recorded duration of each exchange times FACTOR "
+    "when replaying",
+)
+parser.add_argument(
+    "--profile",
+    action="store_true",
+    help="sample each builder update and write collapsed stacks to "
+    "the profiles directory (same as setting OC_STATS_PROFILE)",
+)
+args = parser.parse_args()
+if args.profile:
+    enable_profiling()
+deadline = Deadline.after(args.deadline)
+
+recording: contextlib.AbstractContextManager[T.Any] = contextlib.nullcontext()
+if args.record:
+    from oc_stats.recording import Recorder
+
+    recording = Recorder(args.record)
+elif args.replay:
+    from oc_stats.recording import Replayer
+
+    replayer = Replayer(args.replay, latency_scale=args.replay_latency_scale)
+    replayer.restore_state()
+    recording = replayer
+
 repo = ContextBuilderRepository()
+for builder in repo.builders:
+    if isinstance(builder, DailyTrafficStatsContextBuilder):
+        builder.backfill_since = args.backfill_traffic_since
 repo.load_data()
-repo.update_data()
+with recording:
+    repo.update_data(deadline)
 repo.save_data()
+publish_snapshot(repo)
+# abandoned updates work on copies and are already marked stale, but they
+# may still be writing cache files; let them finish if time allows
+if not repo.join_abandoned(max(deadline.remaining, 0)):
+    logging.warning(
+        f"update: exiting with {len(repo.abandoned)} abandoned updates "
+        "still running"
+    )
+
+for stats in get_cache_stats():
+    logging.info(
+        f"cache: {stats.namespace}: {stats.entry_count} entries, "
+        f"{humanfriendly.format_size(stats.total_size)}"
+    )